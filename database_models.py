@@ -5,7 +5,8 @@ This module defines the SQLAlchemy ORM models for the memory management
 
 # pylint: disable=too-few-public-methods
 
-from sqlalchemy import Column, Integer, ForeignKey, String, PickleType
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, String, PickleType, \
+    inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -18,8 +19,8 @@ class MemRam(Base):
     __tablename__ = 'memram'
 
     id = Column(Integer, primary_key=True)
-    max_mem = Column(Integer)
-    mem = Column(Integer, default=0)
+    max_mem = Column(BigInteger)
+    mem = Column(BigInteger, default=0)
     arenas = relationship("Arena", back_populates="memram")
 
     def __init__(self, max_mem=17_179_869_184):
@@ -34,6 +35,7 @@ class Arena(Base):
     id = Column(Integer, primary_key=True)
     max_mem = Column(Integer, default=262144)
     mem = Column(Integer, default=0)
+    generation = Column(Integer, default=0)  # 0 for young, higher for older
     memram_id = Column(Integer, ForeignKey('memram.id'))
     memram = relationship("MemRam", back_populates="arenas")
     pools = relationship("Pool", back_populates="arena")
@@ -106,3 +108,16 @@ class Ledger(Base):
     stored_object = relationship("StoredObject", back_populates="ledger_entries")
 
 StoredObject.ledger_entries = relationship("Ledger", back_populates="stored_object")
+
+def upgrade_schema(engine) -> None:
+    """
+    Add columns introduced after a database was created.
+
+    create_all only creates missing tables, so columns added to existing
+    tables are added here.
+    """
+    arena_columns = {column["name"] for column in inspect(engine).get_columns('arenas')}
+    if 'generation' not in arena_columns:
+        with engine.begin() as connection:
+            connection.execute(text(
+                "ALTER TABLE arenas ADD COLUMN generation INTEGER DEFAULT 0"))
@@ -0,0 +1,257 @@
+"""
+This module computes utilization and fragmentation reports over the state of
+the memory manager.
+
+Every table is read with a single columnar query into NumPy arrays, and all
+reports are computed with vectorized operations instead of ORM objects.
+"""
+from itertools import chain
+import numpy as np
+from sqlalchemy import select, func
+from database_models import Arena, Pool, Block, Ledger
+
+# The integer columns loaded for each table; missing foreign keys become -1
+COLUMNS = {
+    "arenas": (Arena.id, Arena.memram_id, Arena.mem, Arena.max_mem),
+    "pools": (Pool.id, Pool.arena_id, Pool.mem, Pool.max_mem),
+    "blocks": (Block.id, Block.pool_id, Block.mem, Block.max_mem),
+    "ledger": (Ledger.id, Ledger.arena_id, Ledger.pool_id, Ledger.block_id,
+               Ledger.allocated_mem),
+}
+
+# The string columns loaded alongside the integer columns of a table
+LABELS = {
+    "ledger": (Ledger.object_id,),
+}
+
+
+def _load_table(connection, columns, labels=()) -> dict:
+    statement = select(*(func.coalesce(column, -1) for column in columns), *labels)
+    rows = connection.execute(statement).fetchall()
+    width = len(columns)
+    values = rows if not labels else (row[:width] for row in rows)
+    data = np.fromiter(chain.from_iterable(values), dtype=np.int64,
+                       count=len(rows) * width).reshape(len(rows), width)
+    table = {column.key: data[:, index] for index, column in enumerate(columns)}
+    for index, label in enumerate(labels, start=width):
+        table[label.key] = np.array([row[index] for row in rows], dtype=str)
+    return table
+
+
+def load_columns(engine) -> dict:
+    """
+    Load the arenas, pools, blocks and ledger tables into NumPy arrays.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the memory manager's database.
+
+    Returns
+    -------
+    dict
+        Maps each table name to a dict of column name to int64 array. The
+        ledger also has an ``object_id`` array of strings.
+    """
+    with engine.connect() as connection:
+        return {name: _load_table(connection, columns, LABELS.get(name, ()))
+                for name, columns in COLUMNS.items()}
+
+
+def _ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)),
+                     where=denominator > 0)
+
+
+def _group_sum(keys, ids, values):
+    """Sum ``values`` grouped by ``keys`` for every id in the sorted ``ids``."""
+    if len(ids) == 0:
+        return np.zeros(0)
+    positions = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+    valid = ids[positions] == keys
+    return np.bincount(positions[valid], weights=values[valid], minlength=len(ids))
+
+
+def block_fill_histogram(tables: dict, bins: int = 10) -> dict:
+    """
+    Return the histogram of block fill levels.
+
+    Parameters
+    ----------
+    tables : dict
+        The arrays returned by ``load_columns``.
+    bins : int, optional
+        The number of equal-width fill level bins between 0 and 1.
+
+    Returns
+    -------
+    dict
+        ``counts`` per bin and the bin ``edges``.
+    """
+    blocks = tables["blocks"]
+    fill = _ratio(blocks["mem"], blocks["max_mem"])
+    counts, edges = np.histogram(fill, bins=bins, range=(0.0, 1.0))
+    return {"counts": counts, "edges": edges}
+
+
+def pool_utilization(tables: dict) -> dict:
+    """
+    Return the utilization of every pool.
+
+    Parameters
+    ----------
+    tables : dict
+        The arrays returned by ``load_columns``.
+
+    Returns
+    -------
+    dict
+        Arrays of pool ``id``, ``arena_id``, used ``mem``, ``max_mem``,
+        ``utilization``, number of ``blocks`` and ``block_capacity``.
+    """
+    pools, blocks = tables["pools"], tables["blocks"]
+    order = np.argsort(pools["id"])
+    ids = pools["id"][order]
+    mem = pools["mem"][order]
+    max_mem = pools["max_mem"][order]
+    return {
+        "id": ids,
+        "arena_id": pools["arena_id"][order],
+        "mem": mem,
+        "max_mem": max_mem,
+        "utilization": _ratio(mem, max_mem),
+        "blocks": _group_sum(blocks["pool_id"], ids, np.ones(len(blocks["id"]))).astype(np.int64),
+        "block_capacity": _group_sum(blocks["pool_id"], ids, blocks["max_mem"]).astype(np.int64),
+    }
+
+
+def arena_utilization(tables: dict) -> dict:
+    """
+    Return the utilization of every arena.
+
+    Parameters
+    ----------
+    tables : dict
+        The arrays returned by ``load_columns``.
+
+    Returns
+    -------
+    dict
+        Arrays of arena ``id``, used ``mem``, ``max_mem``, ``utilization``
+        and number of ``pools``.
+    """
+    arenas, pools = tables["arenas"], tables["pools"]
+    order = np.argsort(arenas["id"])
+    ids = arenas["id"][order]
+    mem = arenas["mem"][order]
+    max_mem = arenas["max_mem"][order]
+    return {
+        "id": ids,
+        "mem": mem,
+        "max_mem": max_mem,
+        "utilization": _ratio(mem, max_mem),
+        "pools": _group_sum(pools["arena_id"], ids, np.ones(len(pools["id"]))).astype(np.int64),
+    }
+
+
+def object_size_distribution(tables: dict) -> dict:
+    """
+    Return the distribution of object sizes recorded in the ledger.
+
+    Parameters
+    ----------
+    tables : dict
+        The arrays returned by ``load_columns``.
+
+    Returns
+    -------
+    dict
+        The number of ``objects``, their ``sizes`` and ``blocks_per_object``,
+        size percentiles and a histogram over power-of-two size classes.
+    """
+    ledger = tables["ledger"]
+    if len(ledger["id"]) == 0:
+        return {"objects": 0, "sizes": np.zeros(0, dtype=np.int64),
+                "blocks_per_object": np.zeros(0, dtype=np.int64), "mean": 0.0,
+                "percentiles": {}, "size_classes": {}}
+
+    _, inverse = np.unique(ledger["object_id"], return_inverse=True)
+    sizes = np.bincount(inverse, weights=ledger["allocated_mem"]).astype(np.int64)
+    blocks_per_object = np.bincount(inverse)
+
+    size_class = np.ceil(np.log2(np.maximum(sizes, 1))).astype(np.int64)
+    classes, counts = np.unique(size_class, return_counts=True)
+    return {
+        "objects": len(sizes),
+        "sizes": sizes,
+        "blocks_per_object": blocks_per_object,
+        "mean": float(sizes.mean()),
+        "percentiles": dict(zip((50, 90, 99, 100),
+                                np.percentile(sizes, (50, 90, 99, 100)).tolist())),
+        "size_classes": {int(1 << size): int(count) for size, count in zip(classes, counts)},
+    }
+
+
+def fragmentation_report(tables: dict) -> dict:
+    """
+    Return fragmentation figures for the blocks.
+
+    Parameters
+    ----------
+    tables : dict
+        The arrays returned by ``load_columns``.
+
+    Returns
+    -------
+    dict
+        Block counts by state, free and stranded bytes, the share of free
+        bytes stranded in partially used blocks, and the mean number of blocks
+        an object is split across.
+    """
+    blocks = tables["blocks"]
+    free = blocks["max_mem"] - blocks["mem"]
+    empty = blocks["mem"] == 0
+    full = free <= 0
+    partial = ~empty & ~full
+
+    total_free = int(free[free > 0].sum())
+    stranded = int(free[partial].sum())
+    ledger = tables["ledger"]
+    objects = len(np.unique(ledger["object_id"]))
+    return {
+        "blocks": len(free),
+        "empty_blocks": int(empty.sum()),
+        "partial_blocks": int(partial.sum()),
+        "full_blocks": int(full.sum()),
+        "free_bytes": total_free,
+        "stranded_bytes": stranded,
+        "fragmentation": stranded / total_free if total_free else 0.0,
+        "blocks_per_object": len(ledger["id"]) / objects if objects else 0.0,
+    }
+
+
+def memory_report(engine, bins: int = 10) -> dict:
+    """
+    Load the allocator state once and compute every report.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the memory manager's database.
+    bins : int, optional
+        The number of bins of the block fill level histogram.
+
+    Returns
+    -------
+    dict
+        The ``fill_histogram``, ``pools``, ``arenas``, ``objects`` and
+        ``fragmentation`` reports.
+    """
+    tables = load_columns(engine)
+    return {
+        "fill_histogram": block_fill_histogram(tables, bins),
+        "pools": pool_utilization(tables),
+        "arenas": arena_utilization(tables),
+        "objects": object_size_distribution(tables),
+        "fragmentation": fragmentation_report(tables),
+    }
@@ -0,0 +1,235 @@
+"""
+This module defines the eviction policies that decide which objects are
+freed when the memory manager runs out of room.
+
+A policy only tracks object_ids; the memory manager tells it about inserts,
+accesses through ``get_object`` and frees, and asks it for victims in
+eviction order when the high watermark is crossed.
+"""
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from sqlalchemy import func
+from database_models import Ledger
+
+
+class EvictionPolicy(ABC):
+    """
+    Base class for eviction policies.
+
+    Subclasses keep their own ordering of the tracked objects and yield them
+    from ``victims``, the first victim first.
+    """
+
+    name = None
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of tracked objects."""
+
+    @abstractmethod
+    def __contains__(self, object_id: str) -> bool:
+        """Return whether an object is tracked."""
+
+    def rebuild(self, session) -> None:
+        """
+        Track the objects already stored in the database.
+
+        Parameters
+        ----------
+        session : Session
+            The session used to read the ledger. Objects are inserted in the
+            order they were first allocated.
+        """
+        self.clear()
+        first_entry = func.min(Ledger.id)
+        for (object_id,) in session.query(Ledger.object_id)\
+                .group_by(Ledger.object_id).order_by(first_entry):
+            self.insert(object_id)
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Forget all objects."""
+
+    @abstractmethod
+    def insert(self, object_id: str) -> None:
+        """Track a newly allocated object."""
+
+    def access(self, object_id: str) -> None:
+        """Record an access to an object."""
+
+    @abstractmethod
+    def remove(self, object_id: str) -> None:
+        """Forget an object that was freed."""
+
+    def expired(self) -> list:
+        """Return the objects that must be evicted regardless of pressure."""
+        return []
+
+    @abstractmethod
+    def victims(self):
+        """
+        Yield the tracked objects in eviction order.
+
+        The order is a snapshot; removing objects while iterating is allowed.
+        """
+
+
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently allocated or accessed object first."""
+
+    name = "lru"
+
+    def __init__(self) -> None:
+        self._order = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, object_id: str) -> bool:
+        return object_id in self._order
+
+    def clear(self) -> None:
+        self._order.clear()
+
+    def insert(self, object_id: str) -> None:
+        self._order[object_id] = None
+        self._order.move_to_end(object_id)
+
+    def access(self, object_id: str) -> None:
+        if object_id in self._order:
+            self._order.move_to_end(object_id)
+
+    def remove(self, object_id: str) -> None:
+        self._order.pop(object_id, None)
+
+    def victims(self):
+        yield from list(self._order)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Evict the least frequently accessed object first.
+
+    Ties are broken by evicting the object that was inserted first.
+    """
+
+    name = "lfu"
+
+    def __init__(self) -> None:
+        self._counts = {}
+        self._ticket = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, object_id: str) -> bool:
+        return object_id in self._counts
+
+    def clear(self) -> None:
+        self._counts.clear()
+
+    def insert(self, object_id: str) -> None:
+        self._counts[object_id] = [1, next(self._ticket)]
+
+    def access(self, object_id: str) -> None:
+        count = self._counts.get(object_id)
+        if count is not None:
+            count[0] += 1
+
+    def remove(self, object_id: str) -> None:
+        self._counts.pop(object_id, None)
+
+    def victims(self):
+        heap = [(count, ticket, object_id)
+                for object_id, (count, ticket) in self._counts.items()]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+
+class TTLPolicy(EvictionPolicy):
+    """
+    Evict objects in the order they expire.
+
+    Expired objects are evicted at the next eviction even if less room is
+    needed.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        The number of seconds an object lives after it is allocated.
+    refresh_on_access : bool, optional
+        Restart the lifetime of an object when it is accessed.
+    """
+
+    name = "ttl"
+
+    def __init__(self, ttl: float = 300.0, refresh_on_access: bool = False) -> None:
+        self.ttl = ttl
+        self.refresh_on_access = refresh_on_access
+        self._deadlines = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, object_id: str) -> bool:
+        return object_id in self._deadlines
+
+    def clear(self) -> None:
+        self._deadlines.clear()
+
+    def insert(self, object_id: str) -> None:
+        self._deadlines[object_id] = time.monotonic() + self.ttl
+        self._deadlines.move_to_end(object_id)
+
+    def access(self, object_id: str) -> None:
+        if self.refresh_on_access and object_id in self._deadlines:
+            self.insert(object_id)
+
+    def remove(self, object_id: str) -> None:
+        self._deadlines.pop(object_id, None)
+
+    def expired(self) -> list:
+        now = time.monotonic()
+        return list(itertools.takewhile(lambda object_id: self._deadlines[object_id] <= now,
+                                        self._deadlines))
+
+    def victims(self):
+        yield from list(self._deadlines)
+
+
+EVICTION_POLICIES = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    TTLPolicy.name: TTLPolicy,
+}
+
+
+def get_eviction_policy(policy) -> EvictionPolicy:
+    """
+    Resolve an eviction policy from a name or an EvictionPolicy instance.
+
+    Parameters
+    ----------
+    policy : str or EvictionPolicy
+        One of the names in ``EVICTION_POLICIES``, or a policy instance.
+
+    Returns
+    -------
+    EvictionPolicy
+        The eviction policy to use.
+
+    Raises
+    ------
+    ValueError
+        If ``policy`` is an unknown name.
+    """
+    if isinstance(policy, str):
+        try:
+            return EVICTION_POLICIES[policy]()
+        except KeyError:
+            raise ValueError(f"Unknown eviction policy: {policy!r}") from None
+    return policy
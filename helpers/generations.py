@@ -0,0 +1,194 @@
+"""
+This module implements generational collection, modeled on the generations
+of CPython's gc module.
+
+New objects are allocated in the arenas of generation 0. Collecting a
+generation moves the objects still allocated in it (and in all younger
+generations) into the arenas of the next older generation, so that
+short-lived objects stop fragmenting the blocks of long-lived ones. Young
+collections only touch the young arenas and are cheap; older generations are
+collected less often and have their emptied blocks, pools and arenas removed.
+"""
+import logging
+import time
+from sqlalchemy.exc import SQLAlchemyError
+from database_models import Arena, Pool, Block, Ledger
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationalCollector:
+    """
+    Per-generation counters, thresholds and collections of a memory manager.
+
+    As in CPython, the count of generation 0 is the number of allocations
+    minus frees since it was last collected, and the count of an older
+    generation is the number of collections of the generation below it since
+    it was last collected. When the count of generation 0 exceeds its
+    threshold, the oldest generation whose count exceeds its threshold is
+    collected together with all younger generations.
+
+    Parameters
+    ----------
+    memory_manager : MemManager
+        The memory manager whose arenas are collected.
+    thresholds : tuple of int, optional
+        The collection threshold of every generation, youngest first.
+    """
+
+    def __init__(self, memory_manager, thresholds=(700, 10, 10)) -> None:
+        if not thresholds:
+            raise ValueError("At least one generation threshold is required.")
+        self.memory_manager = memory_manager
+        self.thresholds = list(thresholds)
+        self.counts = [0] * len(self.thresholds)
+        self.stats = [{"collections": 0, "promoted": 0, "promoted_bytes": 0,
+                       "reclaimed_blocks": 0, "seconds": 0.0}
+                      for _ in self.thresholds]
+
+    @property
+    def oldest(self) -> int:
+        """The number of the oldest generation."""
+        return len(self.thresholds) - 1
+
+    def on_allocate(self) -> None:
+        """Count an allocation and collect if a threshold is exceeded."""
+        self.counts[0] += 1
+        if self.counts[0] > self.thresholds[0]:
+            for generation in range(self.oldest, -1, -1):
+                if self.counts[generation] > self.thresholds[generation]:
+                    self.collect(generation)
+                    break
+
+    def on_free(self) -> None:
+        """Count a free."""
+        if self.counts[0] > 0:
+            self.counts[0] -= 1
+
+    def collect(self, generation: int = None) -> dict:
+        """
+        Collect a generation and all younger generations.
+
+        The objects of the collected generations are moved to the next older
+        generation; objects of the oldest generation stay where they are.
+
+        Parameters
+        ----------
+        generation : int, optional
+            The oldest generation to collect. Defaults to the oldest one.
+
+        Returns
+        -------
+        dict
+            The number of objects and bytes promoted and blocks reclaimed.
+        """
+        if generation is None:
+            generation = self.oldest
+        if not 0 <= generation <= self.oldest:
+            raise ValueError(f"Generation must be between 0 and {self.oldest}.")
+
+        target = min(generation + 1, self.oldest)
+        result = {"promoted": 0, "promoted_bytes": 0, "reclaimed_blocks": 0}
+        start = time.perf_counter()
+        with self.memory_manager.lock:
+            for younger in range(generation + 1):
+                stats = self.stats[younger]
+                if younger != target:
+                    promoted, promoted_bytes = self._promote(younger, target)
+                    stats["promoted"] += promoted
+                    stats["promoted_bytes"] += promoted_bytes
+                    result["promoted"] += promoted
+                    result["promoted_bytes"] += promoted_bytes
+                if younger > 0:
+                    # The young arenas keep their empty blocks for new allocations
+                    reclaimed = self._reclaim(younger)
+                    stats["reclaimed_blocks"] += reclaimed
+                    result["reclaimed_blocks"] += reclaimed
+                stats["collections"] += 1
+                self.counts[younger] = 0
+
+        if generation < self.oldest:
+            self.counts[generation + 1] += 1
+        self.stats[generation]["seconds"] += time.perf_counter() - start
+        logger.info("Collected generation %d: promoted %d objects (%d bytes), "
+                    "reclaimed %d blocks.", generation, result["promoted"],
+                    result["promoted_bytes"], result["reclaimed_blocks"])
+        return result
+
+    def _promote(self, generation: int, target: int) -> tuple:
+        """
+        Move every object allocated in ``generation`` to ``target``.
+
+        The whole move is one transaction: the new arenas, pools and blocks
+        are only flushed, and a failure rolls back the ledger entries with
+        them.
+
+        Returns
+        -------
+        tuple
+            The number of objects and bytes moved.
+        """
+        manager = self.memory_manager
+        session = manager.session
+        placement = manager.placement_for(generation)
+        try:
+            entries = session.query(Ledger).join(Arena, Ledger.arena_id == Arena.id)\
+                .filter(Arena.generation == generation).order_by(Ledger.id).all()
+            sizes = {}
+            for ledger_entry in entries:
+                target_block = session.get(Block, ledger_entry.block_id)
+                if target_block:
+                    target_block.mem -= ledger_entry.allocated_mem
+                    target_block.is_free = 0 if target_block.mem == target_block.max_mem else 1
+                    placement.release(target_block.id, ledger_entry.allocated_mem,
+                                      ledger_entry.object_id)
+                sizes[ledger_entry.object_id] = \
+                    sizes.get(ledger_entry.object_id, 0) + ledger_entry.allocated_mem
+                session.delete(ledger_entry)
+
+            for object_id, size in sizes.items():
+                manager.allocate_blocks_for_object(object_id, size, target)
+            session.commit()
+            return len(sizes), sum(sizes.values())
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error promoting generation %d: %s", generation, exc)
+            session.rollback()
+            manager.rebuild_placements()
+            raise
+
+    def _reclaim(self, generation: int) -> int:
+        """
+        Delete the empty blocks of a generation, and pools and arenas left empty.
+
+        Returns
+        -------
+        int
+            The number of blocks deleted.
+        """
+        manager = self.memory_manager
+        session = manager.session
+        try:
+            empty_blocks = session.query(Block).join(Pool, Block.pool_id == Pool.id)\
+                .join(Arena, Pool.arena_id == Arena.id)\
+                .filter(Arena.generation == generation, Block.mem == 0).all()
+            for target_block in empty_blocks:
+                session.delete(target_block)
+            session.flush()
+
+            empty_pools = session.query(Pool).join(Arena, Pool.arena_id == Arena.id)\
+                .filter(Arena.generation == generation, ~Pool.blocks.any()).all()
+            for target_pool in empty_pools:
+                session.delete(target_pool)
+            session.flush()
+
+            empty_arenas = session.query(Arena)\
+                .filter(Arena.generation == generation, ~Arena.pools.any()).all()
+            for target_arena in empty_arenas:
+                session.delete(target_arena)
+            session.commit()
+            manager.placement_for(generation).rebuild(session, generation)
+            return len(empty_blocks)
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error reclaiming generation %d: %s", generation, exc)
+            session.rollback()
+            raise
@@ -5,7 +5,9 @@ This module defines event listeners for SQLAlchemy ORM models.
 from sqlalchemy import event, func
 from sqlalchemy.orm import Session
 from database_models import Block, Pool, Arena, MemRam
+from helpers.profiling import traced
 
+@traced("listener.update_block_and_pool")
 def update_block_and_pool(mapper, connection, target):  # pylint: disable=unused-argument
     """
     Update is_free based on the block's memory usage and update the
@@ -35,6 +37,7 @@ def update_block_and_pool(mapper, connection, target):  # pylint: disable=unused
 # Attach the function to the after_update event for Block
 event.listen(Block, 'after_update', update_block_and_pool)
 
+@traced("listener.update_arena_mem")
 def update_arena_mem(mapper, connection, target):  # pylint: disable=unused-argument
     """
     Update the arena's memory based on the total memory of its pools.
@@ -60,6 +63,7 @@ def update_arena_mem(mapper, connection, target):  # pylint: disable=unused-argu
 # Attach the function to the after_update event for Pool
 event.listen(Pool, 'after_update', update_arena_mem)
 
+@traced("listener.update_arena_memram")
 def update_arena_memram(mapper, connection, target):  # pylint: disable=unused-argument
     """
     Update the memram's memory based on the total memory of its arenas.
@@ -0,0 +1,354 @@
+"""
+This module keeps a reserve of pre-created empty blocks, pools and arenas
+ahead of demand, so that allocations rarely have to create them inline.
+"""
+import logging
+import threading
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
+from database_models import Arena, Pool, Block
+
+logger = logging.getLogger(__name__)
+
+# Parts of the messages of errors that go away when the run is retried
+TRANSIENT_ERRORS = ("database is locked", "database table is locked", "deadlock detected",
+                    "could not serialize access")
+
+
+def is_transient(exc: SQLAlchemyError) -> bool:
+    """Return whether a failed maintenance run should be retried."""
+    if getattr(exc, "connection_invalidated", False):
+        return True
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and \
+        any(error in message for error in TRANSIENT_ERRORS)
+
+
+class ReserveMaintainer:
+    """
+    Background maintenance of the free-space reserve of a memory manager.
+
+    Every ``interval`` seconds the maintainer tops the number of empty blocks
+    up to ``reserve_blocks``, creating pools and arenas when the existing ones
+    have no room for more blocks, and trims the reserve back down when more
+    than ``max_reserve_blocks`` empty blocks are left over. It also keeps
+    ``reserve_pools`` pools without blocks and ``reserve_arenas`` arenas
+    without pools ready. In generational mode the reserve is kept in the
+    arenas of generation 0, where new objects are allocated.
+
+    Rows are created through the maintainer's own session, under the
+    manager's lock, and committed and registered in the placement index in
+    the same locked section. This needs a database that several connections
+    can share (e.g. a SQLite file, not an in-memory database).
+
+    Parameters
+    ----------
+    memory_manager : MemManager
+        The memory manager whose reserve is maintained.
+    reserve_blocks : int, optional
+        The number of empty blocks kept ready for allocations.
+    max_reserve_blocks : int, optional
+        The number of empty blocks above which the reserve is trimmed.
+    interval : float, optional
+        The number of seconds between maintenance runs.
+    reserve_pools : int, optional
+        The number of pools without blocks kept ready.
+    reserve_arenas : int, optional
+        The number of arenas without pools kept ready.
+
+    Attributes
+    ----------
+    error : SQLAlchemyError or None
+        The error that stopped the maintenance thread, if any.
+    """
+
+    def __init__(self, memory_manager, reserve_blocks: int = 16,
+                 max_reserve_blocks: int = 64, interval: float = 0.1,
+                 reserve_pools: int = 0, reserve_arenas: int = 0) -> None:
+        if max_reserve_blocks < reserve_blocks:
+            raise ValueError("max_reserve_blocks must be at least reserve_blocks.")
+        self.memory_manager = memory_manager
+        self.reserve_blocks = reserve_blocks
+        self.max_reserve_blocks = max_reserve_blocks
+        self.reserve_pools = reserve_pools
+        self.reserve_arenas = reserve_arenas
+        self.interval = interval
+        self.error = None
+        self.memram_id = memory_manager.memram.id
+        self.session_factory = sessionmaker(bind=memory_manager.engine,
+                                            expire_on_commit=False)
+        self.stats = {"created_blocks": 0, "created_pools": 0,
+                      "created_arenas": 0, "trimmed_blocks": 0, "runs": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start the maintenance thread.
+
+        Raises
+        ------
+        ValueError
+            If the database is private to one connection, e.g. an in-memory
+            SQLite database, so that the thread would not see the manager's
+            tables.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        engine = self.memory_manager.engine
+        if engine.url.get_backend_name() == "sqlite" and \
+                engine.url.database in (None, "", ":memory:") or \
+                isinstance(engine.pool, (SingletonThreadPool, StaticPool)):
+            raise ValueError("Reserve maintenance needs a database shared by several "
+                             "connections, not an in-memory database.")
+        self.error = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reserve-maintainer",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the maintenance thread and wait for it to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reserve(self) -> int:
+        """Return the current number of empty blocks."""
+        return len(self.memory_manager.placement_for(0).empty_blocks)
+
+    def reserved(self, session) -> tuple:
+        """
+        Return the ids of the empty blocks, pools and arenas of the reserve.
+
+        Parameters
+        ----------
+        session : Session
+            The session used to read the empty rows.
+
+        Returns
+        -------
+        tuple of list
+            The ids of up to ``reserve_blocks`` empty blocks, ``reserve_pools``
+            pools without blocks and ``reserve_arenas`` arenas without pools
+            in generation 0, lowest ids first.
+        """
+        block_ids = session.scalars(
+            select(Block.id).join(Pool, Block.pool_id == Pool.id)
+            .join(Arena, Pool.arena_id == Arena.id)
+            .where(Arena.generation == 0, Block.mem == 0)
+            .order_by(Block.id).limit(self.reserve_blocks)).all()
+        pool_ids = session.scalars(
+            select(Pool.id).join(Arena, Pool.arena_id == Arena.id)
+            .where(Arena.generation == 0, ~Pool.blocks.any())
+            .order_by(Pool.id).limit(self.reserve_pools)).all()
+        arena_ids = session.scalars(select(Arena.id).where(
+            Arena.memram_id == self.memram_id, Arena.generation == 0, ~Arena.pools.any())
+            .order_by(Arena.id).limit(self.reserve_arenas)).all()
+        return block_ids, pool_ids, arena_ids
+
+    def run_once(self) -> None:
+        """Top up or trim the reserve once."""
+        reserve = self.reserve()
+        blocks = max(self.reserve_blocks - reserve, 0)
+        pools, arenas = 0, 0
+        if self.reserve_pools or self.reserve_arenas:
+            with self.session_factory() as session:
+                _, pool_ids, arena_ids = self.reserved(session)
+            pools = self.reserve_pools - len(pool_ids)
+            arenas = self.reserve_arenas - len(arena_ids)
+        if blocks or pools or arenas:
+            self.fill(blocks, pools, arenas)
+        if reserve > self.max_reserve_blocks:
+            self.trim(reserve - self.reserve_blocks)
+        self.stats["runs"] += 1
+
+    def fill(self, count: int, pools: int = 0, arenas: int = 0) -> None:
+        """
+        Create empty blocks, pools and arenas and register them with the
+        memory manager.
+
+        Blocks go into pools whose blocks do not yet add up to the pool's
+        capacity; pools and arenas are created when there is no such room.
+
+        Parameters
+        ----------
+        count : int
+            The number of empty blocks to create.
+        pools : int, optional
+            The number of pools without blocks to create.
+        arenas : int, optional
+            The number of arenas without pools to create.
+        """
+        session = self.session_factory()
+        try:
+            with self.memory_manager.lock:
+                new_arenas, new_pools, new_blocks = self._create(session, count, pools, arenas)
+                session.commit()
+
+                placement = self.memory_manager.placement_for(0)
+                for new_arena in new_arenas:
+                    placement.add_arena(new_arena.id, new_arena.max_mem)
+                for new_pool in new_pools:
+                    placement.add_pool(new_pool.id, new_pool.arena_id, new_pool.max_mem)
+                for new_block in new_blocks:
+                    placement.add_block(new_block.id, new_block.pool_id, new_block.max_mem)
+
+            self.stats["created_arenas"] += len(new_arenas)
+            self.stats["created_pools"] += len(new_pools)
+            self.stats["created_blocks"] += len(new_blocks)
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error filling the reserve: %s", exc)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _create(self, session, count: int, pools: int, arenas: int) -> tuple:
+        """Add the rows of ``fill`` to the session and return the new arenas, pools and blocks."""
+        new_arenas, new_pools, new_blocks = [], [], []
+        for pool_id, room in self._pools_with_room(session):
+            while count > 0:
+                new_block = Block()
+                if new_block.max_mem > room:
+                    break
+                new_block.pool_id = pool_id
+                room -= new_block.max_mem
+                new_blocks.append(new_block)
+                count -= 1
+            if count == 0:
+                break
+
+        while count > 0:
+            new_pool = Pool()
+            new_pool.arena_id = self._arena_with_room(session, new_pool.max_mem, new_arenas)
+            session.add(new_pool)
+            session.flush()
+            new_pools.append(new_pool)
+
+            room = new_pool.max_mem
+            while count > 0:
+                new_block = Block()
+                if new_block.max_mem > room:
+                    break
+                new_block.pool_id = new_pool.id
+                room -= new_block.max_mem
+                new_blocks.append(new_block)
+                count -= 1
+
+        session.add_all(new_blocks)
+
+        for _ in range(pools):
+            new_pool = Pool()
+            new_pool.arena_id = self._arena_with_room(session, new_pool.max_mem, new_arenas)
+            session.add(new_pool)
+            session.flush()
+            new_pools.append(new_pool)
+
+        for _ in range(arenas):
+            new_arena = Arena()
+            new_arena.memram_id = self.memram_id
+            new_arena.generation = 0
+            session.add(new_arena)
+            new_arenas.append(new_arena)
+        session.flush()
+        return new_arenas, new_pools, new_blocks
+
+    def trim(self, count: int) -> None:
+        """
+        Delete surplus empty blocks, and the pools and arenas left empty by it
+        that are not part of the reserve.
+
+        Parameters
+        ----------
+        count : int
+            The number of empty blocks to delete.
+        """
+        if count <= 0:
+            return
+        session = self.session_factory()
+        placement = self.memory_manager.placement_for(0)
+        try:
+            with self.memory_manager.lock:
+                block_ids = placement.empty_blocks.ids[-count:]
+                pool_ids = {placement.block_pool[block_id] for block_id in block_ids}
+                session.execute(delete(Block).where(Block.id.in_(block_ids), Block.mem == 0))
+
+                _, reserved_pools, _ = self.reserved(session)
+                empty_pools = session.scalars(select(Pool.id).where(
+                    Pool.id.in_(pool_ids), Pool.id.not_in(reserved_pools),
+                    ~Pool.blocks.any())).all()
+                arena_ids = {placement.pool_arena.get(pool_id) for pool_id in empty_pools}
+                session.execute(delete(Pool).where(Pool.id.in_(empty_pools)))
+
+                _, _, reserved_arenas = self.reserved(session)
+                empty_arenas = session.scalars(select(Arena.id).where(
+                    Arena.id.in_(arena_ids), Arena.id.not_in(reserved_arenas),
+                    ~Arena.pools.any())).all()
+                session.execute(delete(Arena).where(Arena.id.in_(empty_arenas)))
+                session.commit()
+
+                for block_id in block_ids:
+                    placement.remove_block(block_id)
+                for pool_id in empty_pools:
+                    placement.remove_pool(pool_id)
+                for arena_id in empty_arenas:
+                    placement.remove_arena(arena_id)
+
+            self.stats["trimmed_blocks"] += len(block_ids)
+            logger.info("Trimmed %d reserve blocks, %d pools and %d arenas.",
+                        len(block_ids), len(empty_pools), len(empty_arenas))
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error trimming the block reserve: %s", exc)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _pools_with_room(self, session) -> list:
+        """Return (pool_id, room) for generation-0 pools whose blocks do not fill the pool."""
+        # pylint: disable=not-callable
+        block_capacity = select(Block.pool_id, func.sum(Block.max_mem).label("capacity")) \
+            .group_by(Block.pool_id).subquery()
+        room = Pool.max_mem - func.coalesce(block_capacity.c.capacity, 0)
+        return session.execute(
+            select(Pool.id, room)
+            .join(Arena, Pool.arena_id == Arena.id)
+            .outerjoin(block_capacity, block_capacity.c.pool_id == Pool.id)
+            .where(Arena.generation == 0, room > 0).order_by(Pool.id)).all()
+
+    def _arena_with_room(self, session, pool_size: int, new_arenas: list) -> int:
+        """Return the id of a generation-0 arena with room for a pool, creating one if needed."""
+        # pylint: disable=not-callable
+        pool_capacity = select(Pool.arena_id, func.sum(Pool.max_mem).label("capacity")) \
+            .group_by(Pool.arena_id).subquery()
+        room = Arena.max_mem - func.coalesce(pool_capacity.c.capacity, 0)
+        arena_id = session.execute(
+            select(Arena.id)
+            .outerjoin(pool_capacity, pool_capacity.c.arena_id == Arena.id)
+            .where(Arena.memram_id == self.memram_id, Arena.generation == 0,
+                   room >= pool_size).order_by(Arena.id).limit(1)).scalar()
+        if arena_id is None:
+            new_arena = Arena()
+            new_arena.memram_id = self.memram_id
+            new_arena.generation = 0
+            session.add(new_arena)
+            session.flush()
+            new_arenas.append(new_arena)
+            arena_id = new_arena.id
+        return arena_id
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+                if not is_transient(exc):
+                    self.error = exc
+                    logger.error("Stopped reserve maintenance: %s", exc)
+                    raise
+                # Already logged; retry on the next run
+            self._stop.wait(self.interval)
@@ -0,0 +1,634 @@
+"""
+This module defines the placement policies that decide which block receives
+the next part of an allocation.
+
+Every policy keeps in-memory indexes of the free bytes in blocks, pools and
+arenas so that placement does not have to scan the database.
+"""
+import copy
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from bisect import bisect_left, insort
+from sqlalchemy.engine import make_url
+from database_models import Arena, Pool, Block
+
+
+class SortedIds:
+    """
+    A sorted collection of integer ids with O(log n) lookups.
+    """
+
+    def __init__(self) -> None:
+        self.ids = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, key: int) -> bool:
+        index = bisect_left(self.ids, key)
+        return index < len(self.ids) and self.ids[index] == key
+
+    def add(self, key: int) -> None:
+        """Add an id if it is not already present."""
+        index = bisect_left(self.ids, key)
+        if index == len(self.ids) or self.ids[index] != key:
+            self.ids.insert(index, key)
+
+    def discard(self, key: int) -> None:
+        """Remove an id if it is present."""
+        index = bisect_left(self.ids, key)
+        if index < len(self.ids) and self.ids[index] == key:
+            del self.ids[index]
+
+    def first(self):
+        """Return the smallest id, or None if empty."""
+        return self.ids[0] if self.ids else None
+
+    def ceiling(self, key: int):
+        """Return the smallest id >= key, wrapping around to the first id."""
+        if not self.ids:
+            return None
+        index = bisect_left(self.ids, key)
+        return self.ids[index] if index < len(self.ids) else self.ids[0]
+
+
+class PlacementPolicy(ABC):
+    """
+    Base class for placement policies.
+
+    The base class tracks the free bytes of every block, pool and arena and
+    picks pools and arenas for new blocks in id order. Subclasses decide which
+    existing block receives the next allocation by implementing
+    ``find_block`` and keeping their own index up to date in ``_index``.
+
+    ``used`` is the exact number of bytes charged to the indexed blocks.
+    """
+
+    name = None
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        """Clear all indexes."""
+        self.used = 0
+        self.block_free = {}
+        self.block_capacity = {}
+        self.block_pool = {}
+        self.pool_free = {}
+        self.pool_arena = {}
+        self.arena_free = {}
+        self.empty_blocks = SortedIds()
+        self._free_arenas = SortedIds()
+        self._free_pools = {}
+
+    def empty_copy(self) -> "PlacementPolicy":
+        """Return a policy of the same kind and settings with empty indexes."""
+        policy = copy.copy(self)
+        policy._reset()  # pylint: disable=protected-access
+        return policy
+
+    def rebuild(self, session, generation: int = None) -> None:
+        """
+        Reload all indexes from the database.
+
+        Parameters
+        ----------
+        session : Session
+            The session used to read the arenas, pools and blocks.
+        generation : int, optional
+            Only index the arenas of this generation, and their pools and
+            blocks. Defaults to all arenas.
+        """
+        self._reset()
+        arenas = session.query(Arena.id, Arena.max_mem, Arena.mem)
+        pools = session.query(Pool.id, Pool.arena_id, Pool.max_mem, Pool.mem)
+        blocks = session.query(Block.id, Block.pool_id, Block.max_mem, Block.mem)
+        if generation is not None:
+            arenas = arenas.filter(Arena.generation == generation)
+            pools = pools.join(Arena, Pool.arena_id == Arena.id)\
+                .filter(Arena.generation == generation)
+            blocks = blocks.join(Pool, Block.pool_id == Pool.id)\
+                .join(Arena, Pool.arena_id == Arena.id)\
+                .filter(Arena.generation == generation)
+
+        for arena_id, max_mem, mem in arenas:
+            self.add_arena(arena_id, max_mem - (mem or 0))
+        for pool_id, arena_id, max_mem, mem in pools:
+            self.add_pool(pool_id, arena_id, max_mem - (mem or 0))
+        for block_id, pool_id, max_mem, mem in blocks:
+            self.add_block(block_id, pool_id, max_mem, mem or 0)
+
+    def add_arena(self, arena_id: int, free: int) -> None:
+        """Register an arena with the given free bytes."""
+        self.arena_free[arena_id] = free
+        self._free_pools.setdefault(arena_id, SortedIds())
+        if free > 0:
+            self._free_arenas.add(arena_id)
+
+    def add_pool(self, pool_id: int, arena_id: int, free: int) -> None:
+        """Register a pool of an arena with the given free bytes."""
+        self.pool_free[pool_id] = free
+        self.pool_arena[pool_id] = arena_id
+        if free > 0:
+            self._free_pools.setdefault(arena_id, SortedIds()).add(pool_id)
+
+    def add_block(self, block_id: int, pool_id: int, max_mem: int, mem: int = 0) -> None:
+        """Register a block of a pool with its capacity and used bytes."""
+        self.block_capacity[block_id] = max_mem
+        self.block_pool[block_id] = pool_id
+        self.block_free[block_id] = max_mem - mem
+        self.used += mem
+        if mem == 0:
+            self.empty_blocks.add(block_id)
+        self._index(block_id, 0, max_mem - mem)
+
+    def remove_arena(self, arena_id: int) -> None:
+        """Forget an arena that was deleted."""
+        self.arena_free.pop(arena_id, None)
+        self._free_arenas.discard(arena_id)
+        self._free_pools.pop(arena_id, None)
+
+    def remove_pool(self, pool_id: int) -> None:
+        """Forget a pool that was deleted."""
+        self.pool_free.pop(pool_id, None)
+        arena_id = self.pool_arena.pop(pool_id, None)
+        if arena_id in self._free_pools:
+            self._free_pools[arena_id].discard(pool_id)
+
+    def remove_block(self, block_id: int) -> None:
+        """Forget an empty block that was deleted."""
+        free = self.block_free.pop(block_id, None)
+        if free is None:
+            return
+        self._index(block_id, free, 0)
+        self.empty_blocks.discard(block_id)
+        self.used -= self.block_capacity[block_id] - free
+        del self.block_capacity[block_id]
+        del self.block_pool[block_id]
+
+    def find_arena(self):
+        """Return the id of the first arena with free bytes, or None."""
+        return self._free_arenas.first()
+
+    def find_pool(self, arena_id: int):
+        """Return the id of the first pool in the arena with free bytes, or None."""
+        pools = self._free_pools.get(arena_id)
+        return pools.first() if pools else None
+
+    @abstractmethod
+    def find_block(self, size: int):
+        """
+        Return the id of the block that should receive the next allocation.
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes that still have to be allocated.
+
+        Returns
+        -------
+        int or None
+            The id of the chosen block, or None if no block has free space.
+        """
+
+    def charged_size(self, size: int) -> int:
+        """
+        Return the number of bytes an allocation will be charged at most.
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes requested.
+
+        Returns
+        -------
+        int
+            The requested size, plus any rounding the policy adds.
+        """
+        return size
+
+    def charge(self, block_id: int, size: int, object_id: str) -> tuple:
+        """
+        Claim space in a block for part of an object.
+
+        Parameters
+        ----------
+        block_id : int
+            The block receiving the allocation.
+        size : int
+            The number of bytes that still have to be allocated.
+        object_id : str
+            The unique identifier of the object.
+
+        Returns
+        -------
+        tuple
+            ``(taken, charged)``: the bytes of the object placed in the block
+            and the bytes the block is charged for them.
+        """
+        taken, charged = self._claim(block_id, size, object_id)
+        self._adjust(block_id, -charged)
+        return taken, charged
+
+    def release(self, block_id: int, charged: int, object_id: str) -> None:
+        """
+        Return space previously charged to a block.
+
+        Parameters
+        ----------
+        block_id : int
+            The block the space was charged to.
+        charged : int
+            The number of bytes that were charged.
+        object_id : str
+            The unique identifier of the object.
+        """
+        if block_id not in self.block_free:
+            return
+        self._unclaim(block_id, charged, object_id)
+        self._adjust(block_id, charged)
+
+    def fragmentation(self) -> float:
+        """
+        Return the share of free block bytes stranded in partially used blocks.
+
+        Returns
+        -------
+        float
+            0.0 when all free space is in empty blocks, 1.0 when all of it is
+            scattered across partially used blocks.
+        """
+        total_free = sum(self.block_free.values())
+        if total_free == 0:
+            return 0.0
+        stranded = sum(free for block_id, free in self.block_free.items()
+                       if 0 < free < self.block_capacity[block_id])
+        return stranded / total_free
+
+    def _claim(self, block_id: int, size: int, object_id: str) -> tuple:  # pylint: disable=unused-argument
+        taken = min(size, self.block_free[block_id])
+        return taken, taken
+
+    def _unclaim(self, block_id: int, charged: int, object_id: str) -> None:
+        """Hook for policies that track where in a block an object lives."""
+
+    @abstractmethod
+    def _index(self, block_id: int, old_free: int, new_free: int) -> None:
+        """Hook called whenever the free bytes of a block change."""
+
+    def _adjust(self, block_id: int, delta: int) -> None:
+        old_free = self.block_free[block_id]
+        self.block_free[block_id] = old_free + delta
+        self.used -= delta
+        if old_free + delta == self.block_capacity[block_id]:
+            self.empty_blocks.add(block_id)
+        else:
+            self.empty_blocks.discard(block_id)
+        self._index(block_id, old_free, old_free + delta)
+
+        pool_id = self.block_pool[block_id]
+        if pool_id in self.pool_free:
+            arena_id = self.pool_arena[pool_id]
+            self.pool_free[pool_id] += delta
+            pools = self._free_pools.setdefault(arena_id, SortedIds())
+            if self.pool_free[pool_id] > 0:
+                pools.add(pool_id)
+            else:
+                pools.discard(pool_id)
+
+            if arena_id in self.arena_free:
+                self.arena_free[arena_id] += delta
+                if self.arena_free[arena_id] > 0:
+                    self._free_arenas.add(arena_id)
+                else:
+                    self._free_arenas.discard(arena_id)
+
+
+class FirstFitPolicy(PlacementPolicy):
+    """
+    Place allocations in the lowest numbered block with free space.
+    """
+
+    name = "first-fit"
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._free_blocks = SortedIds()
+
+    def find_block(self, size: int):
+        return self._free_blocks.first()
+
+    def _index(self, block_id: int, old_free: int, new_free: int) -> None:
+        if new_free > 0:
+            self._free_blocks.add(block_id)
+        else:
+            self._free_blocks.discard(block_id)
+
+
+class NextFitPolicy(FirstFitPolicy):
+    """
+    Place allocations in the next block with free space after the last one
+    used, wrapping around at the end (a roving pointer).
+    """
+
+    name = "next-fit"
+
+    def __init__(self) -> None:
+        self._cursor = 0
+        super().__init__()
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._cursor = 0
+
+    def find_block(self, size: int):
+        block_id = self._free_blocks.ceiling(self._cursor)
+        if block_id is not None:
+            self._cursor = block_id
+        return block_id
+
+
+class BestFitPolicy(PlacementPolicy):
+    """
+    Place allocations in the block whose free space fits the request most
+    tightly, using buckets of blocks keyed by their free bytes.
+
+    When no block can hold the whole request the block with the most free
+    space is used, so that the object is split across as few blocks as
+    possible.
+    """
+
+    name = "best-fit"
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._buckets = {}
+        self._sizes = []
+
+    def find_block(self, size: int):
+        if not self._sizes:
+            return None
+        index = bisect_left(self._sizes, size)
+        free = self._sizes[index] if index < len(self._sizes) else self._sizes[-1]
+        return self._buckets[free].first()
+
+    def _index(self, block_id: int, old_free: int, new_free: int) -> None:
+        if old_free > 0 and old_free in self._buckets:
+            bucket = self._buckets[old_free]
+            bucket.discard(block_id)
+            if not bucket:
+                del self._buckets[old_free]
+                del self._sizes[bisect_left(self._sizes, old_free)]
+        if new_free > 0:
+            bucket = self._buckets.get(new_free)
+            if bucket is None:
+                bucket = self._buckets[new_free] = SortedIds()
+                insort(self._sizes, new_free)
+            bucket.add(block_id)
+
+
+class BuddyPolicy(PlacementPolicy):
+    """
+    Buddy allocation inside each block.
+
+    A block is managed as a power-of-two region that is split in halves on
+    demand; every allocation is rounded up to a power of two (at least
+    ``min_chunk`` bytes) and freed chunks are merged with their buddy. Blocks
+    that were already partially used when the index was built are only taken
+    over once they become empty again.
+    """
+
+    name = "buddy"
+
+    def __init__(self, min_chunk: int = 16) -> None:
+        self.min_order = max(min_chunk - 1, 1).bit_length()
+        self._largest = 0
+        super().__init__()
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._chunks = {}
+        self._order_blocks = {}
+        self._owned = {}
+        self._largest = 0
+
+    def find_block(self, size: int):
+        need = self._order_for(size)
+        available = [order for order, blocks in self._order_blocks.items() if blocks]
+        if not available:
+            return None
+        fitting = [order for order in available if order >= need]
+        order = min(fitting) if fitting else max(available)
+        return self._order_blocks[order].first()
+
+    def charged_size(self, size: int) -> int:
+        # Whole blocks are charged exactly, the rest is rounded up to a chunk
+        full, rest = divmod(size, self._largest) if self._largest else (0, size)
+        return full * self._largest + ((1 << self._order_for(rest)) if rest else 0)
+
+    def remove_block(self, block_id: int) -> None:
+        for order in self._chunks.pop(block_id, {}):
+            self._order_blocks[order].discard(block_id)
+        super().remove_block(block_id)
+
+    def _order_for(self, size: int) -> int:
+        return max(self.min_order, (max(size, 1) - 1).bit_length())
+
+    def _top_order(self, block_id: int) -> int:
+        return self.block_capacity[block_id].bit_length() - 1
+
+    def _push(self, block_id: int, order: int, offset: int) -> None:
+        self._chunks[block_id].setdefault(order, set()).add(offset)
+        self._order_blocks.setdefault(order, SortedIds()).add(block_id)
+
+    def _pop(self, block_id: int, order: int, offset: int) -> None:
+        offsets = self._chunks[block_id][order]
+        offsets.discard(offset)
+        if not offsets:
+            del self._chunks[block_id][order]
+            self._order_blocks[order].discard(block_id)
+
+    def _claim(self, block_id: int, size: int, object_id: str) -> tuple:
+        chunks = self._chunks.get(block_id)
+        if not chunks:
+            return 0, 0
+        need = self._order_for(size)
+        fitting = [order for order in chunks if order >= need]
+        order = min(fitting) if fitting else max(chunks)
+        offset = min(chunks[order])
+        self._pop(block_id, order, offset)
+
+        # Split the chunk until it is the smallest one that holds the request
+        while order > need and order > self.min_order:
+            order -= 1
+            self._push(block_id, order, offset + (1 << order))
+
+        self._owned.setdefault((object_id, block_id), []).append((offset, order))
+        charged = 1 << order
+        return min(size, charged), charged
+
+    def _unclaim(self, block_id: int, charged: int, object_id: str) -> None:
+        chunks = self._owned.pop((object_id, block_id), [])
+        top = self._top_order(block_id)
+        for offset, order in chunks:
+            while order < top:
+                buddy = offset ^ (1 << order)
+                if buddy not in self._chunks[block_id].get(order, ()):
+                    break
+                self._pop(block_id, order, buddy)
+                offset = min(offset, buddy)
+                order += 1
+            self._push(block_id, order, offset)
+
+    def _index(self, block_id: int, old_free: int, new_free: int) -> None:
+        capacity = self.block_capacity[block_id]
+        self._largest = max(self._largest, 1 << self._top_order(block_id))
+        if block_id not in self._chunks and new_free == capacity:
+            self._chunks[block_id] = {}
+            self._push(block_id, self._top_order(block_id), 0)
+
+
+POLICIES = {
+    FirstFitPolicy.name: FirstFitPolicy,
+    NextFitPolicy.name: NextFitPolicy,
+    BestFitPolicy.name: BestFitPolicy,
+    BuddyPolicy.name: BuddyPolicy,
+}
+
+
+def get_policy(policy) -> PlacementPolicy:
+    """
+    Resolve a placement policy from a name or a PlacementPolicy instance.
+
+    Parameters
+    ----------
+    policy : str or PlacementPolicy
+        One of the names in ``POLICIES``, or a policy instance.
+
+    Returns
+    -------
+    PlacementPolicy
+        The placement policy to use.
+
+    Raises
+    ------
+    ValueError
+        If ``policy`` is an unknown name.
+    """
+    if isinstance(policy, str):
+        try:
+            return POLICIES[policy]()
+        except KeyError:
+            raise ValueError(f"Unknown placement policy: {policy!r}") from None
+    return policy
+
+
+@contextmanager
+def quiet_logging(level: int = logging.WARNING):
+    """
+    Temporarily raise the memory manager's log level, e.g. while benchmarking.
+
+    Parameters
+    ----------
+    level : int, optional
+        The log level used inside the block. Defaults to WARNING.
+    """
+    manager_logger = logging.getLogger("memorymanager")
+    previous_level = manager_logger.level
+    manager_logger.setLevel(level)
+    try:
+        yield
+    finally:
+        manager_logger.setLevel(previous_level)
+
+
+def replay_workload(memory_manager, workload) -> int:
+    """
+    Run a workload against a memory manager.
+
+    Parameters
+    ----------
+    memory_manager : MemManager
+        The memory manager that executes the workload.
+    workload : iterable of tuple
+        ``(op, obj)`` pairs where op is "allocate", "free" or "get".
+
+    Returns
+    -------
+    int
+        The number of operations executed.
+    """
+    operations = {
+        "allocate": memory_manager.allocate_memory_for_object,
+        "free": memory_manager.free_memory_for_object,
+        "get": memory_manager.get_object,
+    }
+    count = 0
+    for operation, obj in workload:
+        operations[operation](obj)
+        count += 1
+    return count
+
+
+def compare_policies(workload, policies=None, db_url: str = "sqlite://") -> dict:
+    """
+    Replay the same workload under several placement policies.
+
+    Each policy runs against its own in-memory database and INFO logging of
+    the memory manager is suppressed while the workload runs.
+
+    Parameters
+    ----------
+    workload : sequence of tuple
+        ``(op, obj)`` pairs, see ``replay_workload``.
+    policies : iterable of str, optional
+        The policies to compare. Defaults to all policies in ``POLICIES``.
+    db_url : str, optional
+        The database URL used for every run. It must name an in-memory SQLite
+        database, so that every run starts empty. Defaults to ``sqlite://``.
+
+    Returns
+    -------
+    dict
+        For every policy the number of operations, elapsed seconds, operations
+        per second, number of blocks, fragmentation and block utilization.
+
+    Raises
+    ------
+    ValueError
+        If the URL names a database that outlives a run, so that later runs
+        would only repeat the allocations of the first.
+    """
+    from memorymanager import MemManager  # pylint: disable=import-outside-toplevel
+
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        raise ValueError("compare_policies needs an in-memory SQLite database "
+                         "so that every policy starts empty.")
+
+    workload = list(workload)
+    results = {}
+    for name in policies or POLICIES:
+        memory_manager = MemManager(db_url, placement=name)
+        with quiet_logging():
+            start = time.perf_counter()
+            operations = replay_workload(memory_manager, workload)
+            elapsed = time.perf_counter() - start
+
+        policy = memory_manager.placement
+        capacity = sum(policy.block_capacity.values())
+        used = capacity - sum(policy.block_free.values())
+        results[name] = {
+            "operations": operations,
+            "seconds": elapsed,
+            "ops_per_second": operations / elapsed if elapsed else float("inf"),
+            "blocks": len(policy.block_capacity),
+            "fragmentation": policy.fragmentation(),
+            "utilization": used / capacity if capacity else 0.0,
+        }
+        memory_manager.session.close()
+        memory_manager.engine.dispose()
+    return results
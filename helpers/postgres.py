@@ -0,0 +1,241 @@
+"""
+This module implements a set-based allocation path for PostgreSQL.
+
+Instead of reading blocks into Python, changing them and writing them back,
+capacity is claimed with a single ``UPDATE ... RETURNING`` over a candidate
+row picked with ``FOR UPDATE SKIP LOCKED``. Pool, arena and memram totals are
+then adjusted server-side in the same transaction, so several writers can
+allocate concurrently without overwriting each other's changes.
+"""
+from sqlalchemy import Integer, case, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from database_models import MemRam, Arena, Pool, Block, Ledger, StoredObject
+
+# Connection pool defaults for networked PostgreSQL servers
+ENGINE_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+BLOCK_SIZE = Block.__table__.c.max_mem.default.arg
+
+
+def get_engine_options(db_url: str, overrides: dict = None) -> dict:
+    """
+    Return the create_engine options for a database URL.
+
+    Parameters
+    ----------
+    db_url : str
+        The database URL.
+    overrides : dict, optional
+        Options that take precedence over the defaults.
+
+    Returns
+    -------
+    dict
+        ENGINE_OPTIONS for PostgreSQL URLs, merged with ``overrides``.
+    """
+    options = dict(ENGINE_OPTIONS) if db_url.startswith("postgresql") else {}
+    options.update(overrides or {})
+    return options
+
+
+class PostgresAllocator:
+    """
+    Allocate and free memory with set-based statements on PostgreSQL.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the PostgreSQL database.
+    memram_id : int
+        The id of the MemRam row new arenas are attached to.
+    """
+
+    name = "postgresql"
+    # Blocks are claimed in id order, which is first-fit placement
+    placement = "first-fit"
+
+    def __init__(self, engine, memram_id: int) -> None:
+        self.engine = engine
+        self.memram_id = memram_id
+
+    def allocate(self, object_id: str, obj_instance: object, obj_size: int) -> bool:
+        """
+        Store an object and claim capacity for it in one transaction.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+        obj_instance : object
+            The object instance to be stored.
+        obj_size : int
+            The number of bytes to allocate.
+
+        Returns
+        -------
+        bool
+            False if the object was already stored, True otherwise.
+        """
+        with self.engine.begin() as connection:
+            stored = connection.execute(
+                insert(StoredObject)
+                .values(object_id=object_id, object_data=obj_instance)
+                .on_conflict_do_nothing(index_elements=[StoredObject.object_id])
+                .returning(StoredObject.id)).first()
+            if stored is None:
+                return False
+
+            claims = []
+            remaining_size = obj_size
+            while remaining_size > 0:
+                claim = self._claim_existing_block(connection, remaining_size) or \
+                    self._claim_new_block(connection, remaining_size)
+                claims.append(claim)
+                remaining_size -= claim[2]
+
+            pool_deltas = {}
+            for _, pool_id, claimed in claims:
+                pool_deltas[pool_id] = pool_deltas.get(pool_id, 0) + claimed
+            pool_arenas = self._apply_totals(connection, pool_deltas)
+
+            connection.execute(insert(Ledger), [
+                {"arena_id": pool_arenas[pool_id], "pool_id": pool_id, "block_id": block_id,
+                 "object_id": object_id, "allocated_mem": claimed}
+                for block_id, pool_id, claimed in claims])
+        return True
+
+    def free(self, object_id: str) -> int:
+        """
+        Release the capacity of an object and delete it in one transaction.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+
+        Returns
+        -------
+        int
+            The number of bytes freed.
+        """
+        with self.engine.begin() as connection:
+            entries = connection.execute(
+                Ledger.__table__.delete()
+                .where(Ledger.object_id == object_id)
+                .returning(Ledger.block_id, Ledger.pool_id, Ledger.allocated_mem)).all()
+
+            block_deltas, pool_deltas = {}, {}
+            for block_id, pool_id, allocated_mem in entries:
+                block_deltas[block_id] = block_deltas.get(block_id, 0) - allocated_mem
+                pool_deltas[pool_id] = pool_deltas.get(pool_id, 0) - allocated_mem
+
+            if block_deltas:
+                self._update_deltas(connection, Block, block_deltas, lambda delta: {
+                    "mem": Block.mem + delta,
+                    "is_free": case((Block.mem + delta >= Block.max_mem, 0), else_=1),
+                })
+                self._apply_totals(connection, pool_deltas)
+
+            connection.execute(StoredObject.__table__.delete()
+                               .where(StoredObject.object_id == object_id))
+        return -sum(block_deltas.values())
+
+    def _claim_existing_block(self, connection, remaining_size: int):
+        """Claim space in the first free block nobody else has locked."""
+        candidate = select(
+            Block.id, func.least(remaining_size, Block.max_mem - Block.mem).label("claim")
+        ).where(
+            Block.is_free == 1, Block.max_mem - Block.mem > 0
+        ).order_by(Block.id).limit(1).with_for_update(skip_locked=True).cte("candidate")
+
+        new_mem = Block.mem + candidate.c.claim
+        return connection.execute(
+            update(Block)
+            .where(Block.id == candidate.c.id)
+            .values(mem=new_mem, is_free=case((new_mem >= Block.max_mem, 0), else_=1))
+            .returning(Block.id, Block.pool_id, candidate.c.claim)).first()
+
+    def _claim_new_block(self, connection, remaining_size: int) -> tuple:
+        """
+        Insert a block holding the claim, creating a pool and arena if needed.
+
+        The parent pool and arena are only read, not locked: their totals are
+        locked later in a fixed order by ``_apply_totals``.
+        """
+        pool_id = connection.execute(
+            select(Pool.id).where(Pool.max_mem - Pool.mem > 0)
+            .order_by(Pool.id).limit(1)).scalar()
+        if pool_id is None:
+            arena_id = connection.execute(
+                select(Arena.id).where(Arena.max_mem - Arena.mem > 0)
+                .order_by(Arena.id).limit(1)).scalar()
+            if arena_id is None:
+                arena_id = connection.execute(
+                    insert(Arena).values(memram_id=self.memram_id, mem=0)
+                    .returning(Arena.id)).scalar()
+            pool_id = connection.execute(
+                insert(Pool).values(arena_id=arena_id, mem=0).returning(Pool.id)).scalar()
+
+        claimed = min(remaining_size, BLOCK_SIZE)
+        block_id = connection.execute(
+            insert(Block).values(pool_id=pool_id, max_mem=BLOCK_SIZE, mem=claimed,
+                                 is_free=0 if claimed == BLOCK_SIZE else 1)
+            .returning(Block.id)).scalar()
+        return block_id, pool_id, claimed
+
+    def _apply_totals(self, connection, pool_deltas: dict) -> dict:
+        """
+        Add per-pool deltas to the pools, their arenas and memram.
+
+        Returns
+        -------
+        dict
+            The arena_id of every updated pool.
+        """
+        pool_arenas, arena_deltas = {}, {}
+        for pool_id, arena_id, delta in self._update_deltas(
+                connection, Pool, pool_deltas, lambda delta: {"mem": Pool.mem + delta},
+                Pool.arena_id):
+            pool_arenas[pool_id] = arena_id
+            arena_deltas[arena_id] = arena_deltas.get(arena_id, 0) + delta
+
+        memram_deltas = {}
+        for _, memram_id, delta in self._update_deltas(
+                connection, Arena, arena_deltas, lambda delta: {"mem": Arena.mem + delta},
+                Arena.memram_id):
+            memram_deltas[memram_id] = memram_deltas.get(memram_id, 0) + delta
+
+        self._update_deltas(connection, MemRam, memram_deltas,
+                            lambda delta: {"mem": func.coalesce(MemRam.mem, 0) + delta})
+        return pool_arenas
+
+    @staticmethod
+    def _update_deltas(connection, model, deltas: dict, new_values, *returning):
+        """
+        Update the rows of ``model`` listed in ``deltas`` in one statement.
+
+        ``new_values`` is called with the delta column of a VALUES table of
+        (id, delta) rows and returns the SET clause. The rows are locked in id
+        order first, so concurrent transactions always acquire them in the same
+        order (blocks, pools, arenas, memram) and cannot deadlock. The lock is
+        FOR NO KEY UPDATE, which does not conflict with the key-share locks
+        taken by foreign key checks when blocks and pools are inserted.
+        """
+        if not deltas:
+            return []
+        connection.execute(select(model.id).where(model.id.in_(list(deltas)))
+                           .order_by(model.id).with_for_update(key_share=True))
+        delta_table = values(column("id", Integer), column("delta", Integer),
+                             name=f"{model.__tablename__}_deltas").data(sorted(deltas.items()))
+        statement = update(model).where(model.id == delta_table.c.id) \
+            .values(**new_values(delta_table.c.delta))
+        if returning:
+            statement = statement.returning(model.id, *returning, delta_table.c.delta)
+            return connection.execute(statement).all()
+        connection.execute(statement)
+        return []
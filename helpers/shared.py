@@ -0,0 +1,664 @@
+"""
+This module implements a multi-process allocator whose block state lives in
+a ``multiprocessing.shared_memory`` segment.
+
+Every process on a host that opens a MemManager with the same segment name
+claims capacity directly in the segment, under a lock per pool, instead of
+contending on the write lock of a shared SQLite file. The database only
+receives durable snapshots of the ledger and the stored objects.
+
+Segment layout (little-endian int64 unless noted)::
+
+    header       HEADER
+    pool_used    used bytes of every pool
+    block_used   used bytes of every block
+    processes    PROCESS_SLOTS of (PROCESS, journal of JOURNAL_ENTRY)
+    directory    buckets of BUCKET_SLOTS slots of
+                 (state byte, raw 32-byte object_id, owner byte)
+
+In shared mode the ledger's arena_id, pool_id and block_id are the 1-based
+positions of the arena, pool and block in the segment.
+
+Objects that are not yet in a snapshot live only in the memory of the
+process that allocated them. Each process therefore registers in a process
+slot, owns the directory entries of its pending objects and journals the
+bytes it claims for them. A process holds the lock of its slot while it is
+attached, and the operating system releases that lock when the process
+exits, so the other processes can tell when a process exited without
+``close`` and reclaim its pending bytes and directory entries.
+"""
+import logging
+import os
+import struct
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from sqlalchemy import delete, func, insert, select
+from database_models import Arena, Pool, Block, Ledger, StoredObject
+
+try:
+    import fcntl
+    msvcrt = None  # pylint: disable=invalid-name
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"MMSHARE2"
+# magic, block, pool and arena size, pools, buckets, process slots, journal entries
+HEADER = struct.Struct("<8sqqqqqqq")
+HEADER_SIZE = 128
+
+BLOCK_SIZE = Block.__table__.c.max_mem.default.arg
+POOL_SIZE = Pool.__table__.c.max_mem.default.arg
+ARENA_SIZE = Arena.__table__.c.max_mem.default.arg
+
+# Python 3.13+ can keep a segment out of the resource tracker when opening it
+SEGMENT_OPTIONS = {"track": False} if sys.version_info >= (3, 13) else {}
+
+BUCKET_SLOTS = 16
+SLOT = 34
+SLOT_OWNER = 33
+SLOT_EMPTY, SLOT_USED, SLOT_DELETED = 0, 1, 2
+DIRECTORY_STRIPES = 64
+
+# A directory entry's owner is 0 once the object is in a snapshot, and the
+# process slot plus one while it is pending
+PROCESS_SLOTS = 32
+# pid (0 for a free slot) and number of journal entries
+PROCESS = struct.Struct("<qq")
+# directory slot, block and bytes claimed (negative when released)
+JOURNAL_ENTRY = struct.Struct("<iiq")
+
+# Capacity of a new segment when the MemManager has no max_mem
+DEFAULT_MAX_MEM = 64 * 1024 * 1024
+
+
+class RangeLocks:
+    """
+    Cross-process locks, one per byte of a lock file.
+
+    These are advisory record locks (``fcntl.lockf`` on POSIX,
+    ``msvcrt.locking`` on Windows). They exclude other processes, not other
+    threads of the same process.
+
+    Parameters
+    ----------
+    path : str
+        The lock file, created if missing.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT)
+
+    def try_acquire(self, index: int) -> bool:
+        """Acquire lock ``index`` if no other process holds it."""
+        try:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, index)
+            else:
+                os.lseek(self._fd, index, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self, index: int) -> None:
+        """Block until lock ``index`` is held."""
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, index)
+            return
+        os.lseek(self._fd, index, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(0)
+
+    def release(self, index: int) -> None:
+        """Release lock ``index``."""
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, index)
+            return
+        os.lseek(self._fd, index, os.SEEK_SET)
+        msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def locked(self, index: int):
+        """Hold lock ``index`` for the duration of a with block."""
+        self.acquire(index)
+        try:
+            yield
+        finally:
+            self.release(index)
+
+    def close(self) -> None:
+        """Close the lock file."""
+        os.close(self._fd)
+
+
+def _open_segment(name: str, size: int) -> tuple:
+    """
+    Create the segment, or attach to it if another process already did.
+
+    The segment is removed from the resource tracker, so that it outlives
+    the process that created it until ``unlink`` is called.
+
+    Returns
+    -------
+    tuple
+        The SharedMemory and whether it was created by this call.
+    """
+    try:
+        segment = shared_memory.SharedMemory(name, create=True, size=size, **SEGMENT_OPTIONS)
+        created = True
+    except FileExistsError:
+        segment, created = shared_memory.SharedMemory(name, **SEGMENT_OPTIONS), False
+    if os.name == "posix" and not SEGMENT_OPTIONS:
+        from multiprocessing import resource_tracker  # pylint: disable=import-outside-toplevel
+        resource_tracker.unregister(segment._name, "shared_memory")  # pylint: disable=protected-access
+    return segment, created
+
+
+class SharedMemoryAllocator:
+    """
+    Allocate and free memory in a shared-memory segment.
+
+    Allocations claim bytes in the blocks of a pool while holding that
+    pool's lock, and register the object_id in a shared directory for the
+    duplicate check, so no database round-trip is needed. Each process
+    starts looking for room at a different pool to keep lock contention low.
+
+    New objects are kept in ``pending`` until the next ``snapshot`` writes
+    them to the database; until then only this process can read or free
+    them. Freeing a snapshotted object deletes its rows in the database.
+    When a process exits without ``close``, its pending objects are lost;
+    ``reclaim_dead_processes`` releases their bytes and directory entries.
+    It runs when a process attaches, when an allocation finds an object_id
+    held by another process, and before an allocation fails for lack of
+    room.
+
+    The first process to open the segment creates it and loads the block
+    usage and object directory from the last snapshot. The locks exclude
+    other processes only: use one allocator per process and segment, whose
+    calls MemManager serializes with its lock.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database holding the snapshots.
+    name : str
+        The name of the shared-memory segment.
+    max_mem : int, optional
+        The capacity of a newly created segment in bytes, rounded down to
+        whole pools. Attaching processes use the capacity of the segment.
+    max_objects : int, optional
+        The number of objects the directory of a new segment is sized for.
+        Defaults to one object per block.
+    snapshot_every : int, optional
+        The number of pending objects that triggers a snapshot. A new
+        segment journals up to four claims per pending object.
+
+    Raises
+    ------
+    ValueError
+        If the database is not SQLite or already holds blocks. The ledger
+        rows of a snapshot refer to positions in the segment, not to block
+        rows, so they can neither satisfy foreign keys nor share a database
+        with a MemManager that is not in shared mode.
+    """
+
+    name = "shared-memory"
+
+    def __init__(self, engine, name: str, max_mem: int = None, max_objects: int = None,
+                 snapshot_every: int = 1024) -> None:
+        if engine.dialect.name != "sqlite":
+            raise ValueError("Shared-memory mode keeps its snapshots in a SQLite database.")
+        with engine.connect() as connection:
+            if connection.scalar(select(Block.id).limit(1)) is not None:
+                raise ValueError("Shared-memory mode needs a database without blocks; "
+                                 "this one is used by a MemManager not in shared mode.")
+        self.engine = engine
+        self.segment_name = name
+        self.snapshot_every = snapshot_every
+        self.pending = {}
+
+        max_mem = max_mem or DEFAULT_MAX_MEM
+        pools = max(max_mem // POOL_SIZE, 1)
+        buckets = max((max_objects or pools * (POOL_SIZE // BLOCK_SIZE)) * 2 // BUCKET_SLOTS, 1)
+        journal = max(snapshot_every, 1) * 4
+        size = HEADER_SIZE + pools * POOL_SIZE // BLOCK_SIZE * 8 + pools * 8 \
+            + PROCESS_SLOTS * (PROCESS.size + journal * JOURNAL_ENTRY.size) \
+            + buckets * BUCKET_SLOTS * SLOT
+
+        self.locks = RangeLocks(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+        self.segment, created = _open_segment(name, size)
+        if created:
+            self.pools, self.buckets = pools, buckets
+            self.processes, self.journal = PROCESS_SLOTS, journal
+            self._map()
+            self._load_snapshot()
+            self._write_header()
+        else:
+            self._wait_until_ready()
+            self._map()
+        self.slot = None
+        self._journal_count = 0
+        self.slot = self._register()
+        self._cursor = (os.getpid() * 2654435761) % self.pools
+
+    @property
+    def max_mem(self) -> int:
+        """The capacity of the segment in bytes."""
+        return self.pools * POOL_SIZE
+
+    def used(self) -> int:
+        """Return the number of bytes allocated in the segment."""
+        return sum(self.pool_used)
+
+    def allocate(self, object_id: str, obj_instance: object, obj_size: int) -> bool:
+        """
+        Claim capacity for an object in the segment.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+        obj_instance : object
+            The object instance to be stored.
+        obj_size : int
+            The number of bytes to allocate.
+
+        Returns
+        -------
+        bool
+            False if the object was already stored by any process, True otherwise.
+
+        Raises
+        ------
+        MemoryError
+            If the segment does not have enough free space.
+        """
+        owner = self.slot + 1
+        added, dir_slot = self._directory_add(object_id, owner)
+        if not added:
+            # The entry may be left over from a process that exited without close
+            if self.directory[dir_slot + SLOT_OWNER] in (0, owner) \
+                    or not self.reclaim_dead_processes():
+                return False
+            added, dir_slot = self._directory_add(object_id, owner)
+            if not added:
+                return False
+
+        parts, remaining_size = self._claim_size(obj_size, dir_slot)
+        if remaining_size > 0:
+            # A snapshot empties a full journal, and dead processes may hold room
+            self._unclaim(parts)
+            self.snapshot()
+            self.reclaim_dead_processes()
+            parts, remaining_size = self._claim_size(obj_size, dir_slot)
+
+        if remaining_size > 0:
+            self._unclaim(parts)
+            self._directory_remove(object_id)
+            raise MemoryError("Not enough shared memory to allocate object.")
+
+        self.pending[object_id] = (obj_instance, parts, dir_slot)
+        if len(self.pending) >= self.snapshot_every:
+            self.snapshot()
+        return True
+
+    def free(self, object_id: str) -> int:
+        """
+        Release the capacity of an object and forget it.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+
+        Returns
+        -------
+        int
+            The number of bytes freed.
+        """
+        pending = self.pending.get(object_id)
+        if pending is not None and self._journal_count + len(pending[1]) > self.journal:
+            # No room to journal the release: make the object durable first
+            self.snapshot()
+            pending = None
+        if pending is not None:
+            del self.pending[object_id]
+            _, parts, dir_slot = pending
+            self._release(parts, dir_slot)
+        else:
+            with self.engine.begin() as connection:
+                rows = connection.execute(
+                    delete(Ledger).where(Ledger.object_id == object_id)
+                    .returning(Ledger.block_id, Ledger.allocated_mem)).all()
+                connection.execute(delete(StoredObject)
+                                   .where(StoredObject.object_id == object_id))
+            parts = [(block_id - 1, allocated_mem) for block_id, allocated_mem in rows]
+            if not parts:
+                return 0
+            self._release(parts)
+
+        self._directory_remove(object_id)
+        return sum(taken for _, taken in parts)
+
+    def snapshot(self) -> int:
+        """
+        Write the pending objects and their ledger entries to the database.
+
+        Returns
+        -------
+        int
+            The number of objects written.
+        """
+        if not self.pending:
+            return 0
+        blocks_per_pool = POOL_SIZE // BLOCK_SIZE
+        pools_per_arena = ARENA_SIZE // POOL_SIZE
+        objects, entries = [], []
+        for object_id, (obj_instance, parts, _) in self.pending.items():
+            objects.append({"object_id": object_id, "object_data": obj_instance})
+            for block, taken in parts:
+                pool = block // blocks_per_pool
+                entries.append({"arena_id": pool // pools_per_arena + 1, "pool_id": pool + 1,
+                                "block_id": block + 1, "object_id": object_id,
+                                "allocated_mem": taken})
+        with self.engine.begin() as connection:
+            connection.execute(insert(StoredObject), objects)
+            connection.execute(insert(Ledger), entries)
+        for _, _, dir_slot in self.pending.values():
+            with self.locks.locked(self._stripe(dir_slot)):
+                self.directory[dir_slot + SLOT_OWNER] = 0
+        self._set_journal_count(0)
+        self.pending = {}
+        logger.info("Snapshot of %d objects written to the database.", len(objects))
+        return len(objects)
+
+    def reclaim_dead_processes(self) -> int:
+        """
+        Release the pending bytes and directory entries of processes that
+        exited without ``close``.
+
+        Returns
+        -------
+        int
+            The number of processes reclaimed.
+        """
+        with self.locks.locked(self._registry_lock):
+            return self._reclaim_dead()
+
+    def close(self) -> None:
+        """Write a final snapshot and detach from the segment."""
+        self.snapshot()
+        with self.locks.locked(self._registry_lock):
+            PROCESS.pack_into(self.segment.buf, self._process_offset(self.slot), 0, 0)
+            self.locks.release(self._process_lock(self.slot))
+        self.pool_used.release()
+        self.block_used.release()
+        self.directory.release()
+        self.segment.close()
+        self.locks.close()
+
+    def unlink(self) -> None:
+        """Destroy the segment. Call once, after every process has closed it."""
+        shared_memory.SharedMemory(self.segment_name, **SEGMENT_OPTIONS).unlink()
+        try:
+            os.remove(self.locks.path)
+        except OSError:
+            pass
+
+    def _write_header(self) -> None:
+        """Publish the geometry; the magic is written last and marks the segment ready."""
+        HEADER.pack_into(self.segment.buf, 0, bytes(len(SEGMENT_MAGIC)), BLOCK_SIZE,
+                         POOL_SIZE, ARENA_SIZE, self.pools, self.buckets,
+                         self.processes, self.journal)
+        self.segment.buf[:len(SEGMENT_MAGIC)] = SEGMENT_MAGIC
+
+    def _wait_until_ready(self, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            magic, block_size, pool_size, _, pools, buckets, processes, journal = \
+                HEADER.unpack_from(self.segment.buf, 0)
+            if magic == SEGMENT_MAGIC:
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Shared memory segment {self.segment_name!r} "
+                                   "was not initialized.")
+            time.sleep(0.01)
+        if (block_size, pool_size) != (BLOCK_SIZE, POOL_SIZE):
+            raise ValueError(f"Shared memory segment {self.segment_name!r} uses "
+                             "a different block geometry.")
+        self.pools, self.buckets = pools, buckets
+        self.processes, self.journal = processes, journal
+
+    def _map(self) -> None:
+        blocks = self.pools * POOL_SIZE // BLOCK_SIZE
+        start = HEADER_SIZE
+        self.pool_used = self.segment.buf[start:start + self.pools * 8].cast("q")
+        start += self.pools * 8
+        self.block_used = self.segment.buf[start:start + blocks * 8].cast("q")
+        start += blocks * 8
+        self._processes_start = start
+        start += self.processes * (PROCESS.size + self.journal * JOURNAL_ENTRY.size)
+        self.directory = self.segment.buf[start:start + self.buckets * BUCKET_SLOTS * SLOT]
+
+    def _load_snapshot(self) -> None:
+        """Restore block usage and the directory from the database."""
+        blocks_per_pool = POOL_SIZE // BLOCK_SIZE
+        with self.engine.connect() as connection:
+            usage = connection.execute(
+                select(Ledger.block_id, func.sum(Ledger.allocated_mem))
+                .group_by(Ledger.block_id)).all()
+            object_ids = connection.execute(select(StoredObject.object_id)).scalars().all()
+        for block_id, allocated_mem in usage:
+            block = block_id - 1
+            if 0 <= block < len(self.block_used):
+                self.block_used[block] += allocated_mem
+                self.pool_used[block // blocks_per_pool] += allocated_mem
+        for object_id in object_ids:
+            self._directory_add(object_id, 0)
+
+    @property
+    def _registry_lock(self) -> int:
+        return self.pools + DIRECTORY_STRIPES
+
+    def _process_lock(self, process: int) -> int:
+        return self.pools + DIRECTORY_STRIPES + 1 + process
+
+    def _process_offset(self, process: int) -> int:
+        return self._processes_start \
+            + process * (PROCESS.size + self.journal * JOURNAL_ENTRY.size)
+
+    def _register(self) -> int:
+        """Take a free process slot, after reclaiming the slots of dead processes."""
+        with self.locks.locked(self._registry_lock):
+            self._reclaim_dead()
+            for process in range(self.processes):
+                offset = self._process_offset(process)
+                pid, _ = PROCESS.unpack_from(self.segment.buf, offset)
+                if pid == 0:
+                    self.locks.acquire(self._process_lock(process))
+                    PROCESS.pack_into(self.segment.buf, offset, os.getpid(), 0)
+                    return process
+        raise RuntimeError(f"More than {self.processes} processes attached to shared "
+                           f"memory segment {self.segment_name!r}.")
+
+    def _reclaim_dead(self) -> int:
+        """Reclaim every process slot whose lock is free; hold the registry lock."""
+        reclaimed = 0
+        for process in range(self.processes):
+            if process == self.slot:
+                continue
+            pid, _ = PROCESS.unpack_from(self.segment.buf, self._process_offset(process))
+            if pid == 0 or not self.locks.try_acquire(self._process_lock(process)):
+                continue
+            try:
+                self._reclaim(process, pid)
+            finally:
+                self.locks.release(self._process_lock(process))
+            reclaimed += 1
+        return reclaimed
+
+    def _reclaim(self, process: int, pid: int) -> None:
+        """Release what a dead process claimed for objects that never reached a snapshot."""
+        owner = process + 1
+        pending = {}
+        for dir_slot in range(0, len(self.directory), SLOT):
+            if self.directory[dir_slot] == SLOT_USED \
+                    and self.directory[dir_slot + SLOT_OWNER] == owner:
+                pending[dir_slot] = bytes(self.directory[dir_slot + 1:dir_slot + SLOT_OWNER]).hex()
+
+        # The process may have died between writing a snapshot and clearing its owners
+        durable = set()
+        if pending:
+            with self.engine.connect() as connection:
+                durable = set(connection.execute(
+                    select(StoredObject.object_id)
+                    .where(StoredObject.object_id.in_(pending.values()))).scalars())
+
+        offset = self._process_offset(process)
+        _, count = PROCESS.unpack_from(self.segment.buf, offset)
+        claimed = {}
+        for index in range(count):
+            dir_slot, block, taken = JOURNAL_ENTRY.unpack_from(
+                self.segment.buf, offset + PROCESS.size + index * JOURNAL_ENTRY.size)
+            if dir_slot in pending and pending[dir_slot] not in durable:
+                claimed[block] = claimed.get(block, 0) + taken
+        self._release([(block, taken) for block, taken in claimed.items() if taken > 0])
+
+        for dir_slot, object_id in pending.items():
+            with self.locks.locked(self._stripe(dir_slot)):
+                if object_id in durable:
+                    self.directory[dir_slot + SLOT_OWNER] = 0
+                else:
+                    self.directory[dir_slot] = SLOT_DELETED
+        PROCESS.pack_into(self.segment.buf, offset, 0, 0)
+        logger.warning("Reclaimed %d objects (%d bytes) of process %d, which exited "
+                       "without closing the shared memory segment.",
+                       len(pending) - len(durable), sum(claimed.values()), pid)
+
+    def _set_journal_count(self, count: int) -> None:
+        self._journal_count = count
+        struct.pack_into("<q", self.segment.buf,
+                         self._process_offset(self.slot) + 8, count)
+
+    def _journal(self, dir_slot: int, block: int, taken: int) -> None:
+        JOURNAL_ENTRY.pack_into(self.segment.buf, self._process_offset(self.slot)
+                                + PROCESS.size + self._journal_count * JOURNAL_ENTRY.size,
+                                dir_slot, block, taken)
+        self._set_journal_count(self._journal_count + 1)
+
+    def _claim_size(self, obj_size: int, dir_slot: int) -> tuple:
+        """Claim ``obj_size`` bytes from the pools; return the parts and the bytes still needed."""
+        parts = []
+        remaining_size = obj_size
+        pool = self._cursor
+        for _ in range(self.pools):
+            if self.pool_used[pool] < POOL_SIZE:
+                remaining_size = self._claim(pool, remaining_size, parts, dir_slot)
+                if remaining_size == 0 or self._journal_count == self.journal:
+                    break
+            pool = (pool + 1) % self.pools
+        self._cursor = pool
+        return parts, remaining_size
+
+    def _claim(self, pool: int, remaining_size: int, parts: list, dir_slot: int) -> int:
+        """Claim free bytes in the blocks of a pool; return the bytes still needed."""
+        blocks_per_pool = POOL_SIZE // BLOCK_SIZE
+        with self.locks.locked(pool):
+            first = pool * blocks_per_pool
+            for block in range(first, first + blocks_per_pool):
+                taken = min(BLOCK_SIZE - self.block_used[block], remaining_size)
+                if taken <= 0:
+                    continue
+                if self._journal_count == self.journal:
+                    break
+                # A process that dies between the two writes leaks the bytes
+                # instead of releasing them twice
+                self.block_used[block] += taken
+                self.pool_used[pool] += taken
+                self._journal(dir_slot, block, taken)
+                parts.append((block, taken))
+                remaining_size -= taken
+                if remaining_size == 0:
+                    break
+        return remaining_size
+
+    def _unclaim(self, parts: list) -> None:
+        """Undo the most recent claims and drop their journal entries."""
+        blocks_per_pool = POOL_SIZE // BLOCK_SIZE
+        for block, taken in reversed(parts):
+            pool = block // blocks_per_pool
+            with self.locks.locked(pool):
+                self._set_journal_count(self._journal_count - 1)
+                self.block_used[block] -= taken
+                self.pool_used[pool] -= taken
+
+    def _release(self, parts: list, dir_slot: int = None) -> None:
+        """Release claimed bytes, journaling the release of pending objects."""
+        blocks_per_pool = POOL_SIZE // BLOCK_SIZE
+        for block, taken in parts:
+            pool = block // blocks_per_pool
+            with self.locks.locked(pool):
+                if dir_slot is not None:
+                    self._journal(dir_slot, block, -taken)
+                self.block_used[block] -= taken
+                self.pool_used[pool] -= taken
+
+    def _bucket(self, key: bytes) -> int:
+        return int.from_bytes(key[:8], "little") % self.buckets
+
+    def _stripe(self, dir_slot: int) -> int:
+        """Return the lock of the bucket holding a directory slot."""
+        return self.pools + dir_slot // (BUCKET_SLOTS * SLOT) % DIRECTORY_STRIPES
+
+    def _directory_add(self, object_id: str, owner: int) -> tuple:
+        """
+        Add an object_id to the directory.
+
+        Returns
+        -------
+        tuple
+            Whether the object_id was added, and the offset of its slot.
+        """
+        key = bytes.fromhex(object_id)
+        bucket = self._bucket(key)
+        start = bucket * BUCKET_SLOTS * SLOT
+        with self.locks.locked(self.pools + bucket % DIRECTORY_STRIPES):
+            free_slot = None
+            for slot in range(start, start + BUCKET_SLOTS * SLOT, SLOT):
+                state = self.directory[slot]
+                if state == SLOT_USED and self.directory[slot + 1:slot + SLOT_OWNER] == key:
+                    return False, slot
+                if state != SLOT_USED and free_slot is None:
+                    free_slot = slot
+                if state == SLOT_EMPTY:
+                    break
+            if free_slot is None:
+                raise MemoryError("The shared object directory is full.")
+            self.directory[free_slot + 1:free_slot + SLOT_OWNER] = key
+            self.directory[free_slot + SLOT_OWNER] = owner
+            self.directory[free_slot] = SLOT_USED
+        return True, free_slot
+
+    def _directory_remove(self, object_id: str) -> None:
+        key = bytes.fromhex(object_id)
+        bucket = self._bucket(key)
+        start = bucket * BUCKET_SLOTS * SLOT
+        with self.locks.locked(self.pools + bucket % DIRECTORY_STRIPES):
+            for slot in range(start, start + BUCKET_SLOTS * SLOT, SLOT):
+                state = self.directory[slot]
+                if state == SLOT_EMPTY:
+                    return
+                if state == SLOT_USED and self.directory[slot + 1:slot + SLOT_OWNER] == key:
+                    self.directory[slot] = SLOT_DELETED
+                    return
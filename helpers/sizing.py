@@ -0,0 +1,334 @@
+"""
+This module defines size estimators used by the memory manager to bill
+objects for the memory they occupy.
+"""
+import sys
+import pickle
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+# Types whose size is fully described by sys.getsizeof (no references to follow)
+ATOMIC_TYPES = frozenset({int, float, complex, bool, str, bytes, bytearray,
+                          range, type(None), type(Ellipsis), type(NotImplemented)})
+
+# Types that are shared program structure rather than data; only their own
+# header is billed so that sizing an instance never walks a whole module graph.
+OPAQUE_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+# Containers with at least this many children have their atomic children
+# counted in bulk; for fewer, the set-up costs more than walking them
+BULK_CHILDREN = 16
+
+_MISSING = object()
+
+
+class Sizer(ABC):
+    """
+    Base class for object size estimators.
+
+    Subclasses implement ``sizeof`` and return the number of bytes an object
+    should be billed for. Calling a sizer with a ``key`` that identifies the
+    object's content (e.g. its object_id) caches the size of the whole
+    structure under that key, so an object is only walked once.
+
+    Parameters
+    ----------
+    cache_size : int, optional
+        The number of keyed sizes kept, least recently used first out.
+    """
+
+    def __init__(self, cache_size: int = 1024) -> None:
+        self.cache_size = cache_size
+        self._sizes = OrderedDict()
+
+    @abstractmethod
+    def sizeof(self, obj) -> int:
+        """
+        Return the size of an object in bytes.
+
+        Parameters
+        ----------
+        obj : object
+            The object to be sized.
+
+        Returns
+        -------
+        int
+            The size of the object in bytes.
+        """
+
+    def __call__(self, obj, key=None) -> int:
+        if key is None:
+            return self.sizeof(obj)
+        size = self._sizes.get(key)
+        if size is not None:
+            self._sizes.move_to_end(key)
+            return size
+        size = self.sizeof(obj)
+        self._sizes[key] = size
+        if len(self._sizes) > self.cache_size:
+            self._sizes.popitem(last=False)
+        return size
+
+
+class CallableSizer(Sizer):
+    """
+    Adapt a plain ``function(obj) -> int`` to the Sizer interface.
+
+    Parameters
+    ----------
+    function : callable
+        Returns the size of an object in bytes.
+    """
+
+    def __init__(self, function) -> None:
+        super().__init__()
+        self.function = function
+
+    def sizeof(self, obj) -> int:
+        return self.function(obj)
+
+
+class ShallowSizer(Sizer):
+    """
+    Size an object with its own ``__sizeof__``, ignoring anything it references.
+    """
+
+    def sizeof(self, obj) -> int:
+        return obj.__sizeof__()
+
+
+class SerializedSizer(Sizer):
+    """
+    Size an object by the length of its pickled representation.
+
+    This matches what the StoredObject table actually persists.
+
+    Parameters
+    ----------
+    protocol : int
+        The pickle protocol used for serialization.
+    """
+
+    def __init__(self, protocol: int = pickle.HIGHEST_PROTOCOL) -> None:
+        super().__init__()
+        self.protocol = protocol
+
+    def sizeof(self, obj) -> int:
+        return len(pickle.dumps(obj, protocol=self.protocol))
+
+
+class DeepSizer(Sizer):
+    """
+    Size an object together with everything reachable from it.
+
+    Containers and instance attributes are followed iteratively and every
+    object is counted once (so shared references and cycles are handled).
+    Strings and numbers held by a container are counted in bulk, and the
+    per-type dispatch, ``__slots__`` layouts and the header cost of instances
+    with the same attribute shape are memoized.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._handlers = {
+            dict: self._size_mapping,
+            list: self._size_iterable,
+            tuple: self._size_iterable,
+            set: self._size_iterable,
+            frozenset: self._size_iterable,
+            deque: self._size_iterable,
+        }
+        self._dispatch_cache = {}
+        self._slots_cache = {}
+        self._shape_cache = {}
+
+    def register(self, target_type: type, handler) -> None:
+        """
+        Register a fast path for a type.
+
+        Parameters
+        ----------
+        target_type : type
+            The type (and its subclasses) handled by ``handler``.
+        handler : callable
+            Called as ``handler(obj, pending)``; returns the bytes owned by
+            ``obj`` itself and appends referenced objects to ``pending``.
+        """
+        self._handlers[target_type] = handler
+        self._dispatch_cache.clear()
+
+    def sizeof(self, obj) -> int:
+        if type(obj) in ATOMIC_TYPES:
+            return sys.getsizeof(obj)
+
+        getsizeof = sys.getsizeof
+        dispatch = self._dispatch_cache
+        seen = set()
+        pending = [obj]
+        total = 0
+        while pending:
+            item = pending.pop()
+            item_id = id(item)
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+
+            item_type = type(item)
+            if item_type in ATOMIC_TYPES:
+                total += getsizeof(item)
+                continue
+            handler = dispatch.get(item_type)
+            if handler is None:
+                handler = self._resolve_handler(item_type)
+            start = len(pending)
+            total += handler(item, pending)
+            if len(pending) - start >= BULK_CHILDREN:
+                total += self._size_atomic_children(pending, start, seen)
+        return total
+
+    @staticmethod
+    def _size_atomic_children(pending: list, start: int, seen: set) -> int:
+        """
+        Size the atomic objects a handler queued from ``start`` in bulk.
+
+        Containers of strings and numbers are the common case, so their
+        children are counted with C-level set and map operations instead of
+        one trip each through the walk. Atomic objects are not tracked by the
+        garbage collector, so ``type.__sizeof__`` equals ``sys.getsizeof``
+        for them and avoids its per-call overhead. Non-atomic children stay
+        queued.
+        """
+        children = pending[start:]
+        child_types = set(map(type, children))
+        atomic_types = child_types & ATOMIC_TYPES
+        if not atomic_types:
+            return 0
+        if len(atomic_types) < len(child_types):
+            pending[start:] = [child for child in children
+                               if type(child) not in ATOMIC_TYPES]
+            children = [child for child in children
+                        if type(child) in ATOMIC_TYPES]
+        else:
+            del pending[start:]
+
+        child_ids = set(map(id, children))
+        new_ids = child_ids - seen
+        seen.update(new_ids)
+        if len(new_ids) == len(children):
+            # No child was counted before, the usual case
+            new_children = children
+        else:
+            by_id = dict(zip(map(id, children), children))
+            new_children = map(by_id.__getitem__, new_ids)
+        if len(atomic_types) == 1:
+            (child_type,) = atomic_types
+            return sum(map(child_type.__sizeof__, new_children))
+        return sum(type(child).__sizeof__(child) for child in new_children)
+
+    def _resolve_handler(self, item_type: type):
+        """
+        Find the handler for a type by walking its MRO and cache the result.
+        """
+        handler = None
+        if issubclass(item_type, OPAQUE_TYPES):
+            handler = self._size_opaque
+        else:
+            for base in item_type.__mro__:
+                handler = self._handlers.get(base)
+                if handler is not None:
+                    break
+        if handler is None:
+            handler = self._size_instance
+        self._dispatch_cache[item_type] = handler
+        return handler
+
+    @staticmethod
+    def _size_opaque(item, pending) -> int:  # pylint: disable=unused-argument
+        return sys.getsizeof(item)
+
+    @staticmethod
+    def _size_iterable(item, pending) -> int:
+        pending.extend(item)
+        return sys.getsizeof(item)
+
+    @staticmethod
+    def _size_mapping(item, pending) -> int:
+        pending.extend(item.keys())
+        pending.extend(item.values())
+        return sys.getsizeof(item)
+
+    def _size_instance(self, item, pending) -> int:
+        item_type = type(item)
+        size = 0
+
+        attrs = getattr(item, "__dict__", None)
+        if isinstance(attrs, dict):
+            shape = (item_type, tuple(attrs))
+            header = self._shape_cache.get(shape)
+            if header is None:
+                header = sys.getsizeof(item) + sys.getsizeof(attrs)
+                self._shape_cache[shape] = header
+            size += header
+            pending.extend(attrs.values())
+        else:
+            size += sys.getsizeof(item)
+
+        slots = self._slots_cache.get(item_type)
+        if slots is None:
+            slots = self._collect_slots(item_type)
+            self._slots_cache[item_type] = slots
+        for name in slots:
+            value = getattr(item, name, _MISSING)
+            if value is not _MISSING:
+                pending.append(value)
+        return size
+
+    @staticmethod
+    def _collect_slots(item_type: type) -> tuple:
+        names = []
+        for base in item_type.__mro__:
+            base_slots = base.__dict__.get("__slots__", ())
+            if isinstance(base_slots, str):
+                base_slots = (base_slots,)
+            names.extend(name for name in base_slots
+                         if name not in ("__dict__", "__weakref__"))
+        return tuple(names)
+
+
+SIZERS = {
+    "shallow": ShallowSizer,
+    "deep": DeepSizer,
+    "serialized": SerializedSizer,
+}
+
+
+def get_sizer(sizer) -> Sizer:
+    """
+    Resolve a sizer from a name, a Sizer instance or a plain callable.
+
+    Parameters
+    ----------
+    sizer : str or Sizer or callable
+        One of the names in ``SIZERS``, a Sizer, or a function that sizes
+        objects.
+
+    Returns
+    -------
+    Sizer
+        The size estimator to use. Functions are wrapped in a CallableSizer.
+
+    Raises
+    ------
+    ValueError
+        If ``sizer`` is an unknown name.
+    """
+    if isinstance(sizer, str):
+        try:
+            return SIZERS[sizer]()
+        except KeyError:
+            raise ValueError(f"Unknown sizer: {sizer!r}") from None
+    if not isinstance(sizer, Sizer):
+        return CallableSizer(sizer)
+    return sizer
@@ -0,0 +1,253 @@
+"""
+This module records the requests made to the memory manager into a compact
+binary trace and replays such traces against a fresh memory manager.
+
+A trace file starts with ``TRACE_MAGIC`` followed by fixed-size records of
+(timestamp in ns since the recording started, op code, raw 32-byte object_id,
+size in bytes).
+
+Usage::
+
+    python -m helpers.trace replay trace.bin --db sqlite:// --placement best-fit
+"""
+import argparse
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from helpers.placement import quiet_logging, replay_workload
+
+TRACE_MAGIC = b"MMTRACE1"
+RECORD = struct.Struct("<QB32sQ")
+
+OP_ALLOCATE = 1
+OP_FREE = 2
+OP_GET = 3
+OP_NAMES = {OP_ALLOCATE: "allocate", OP_FREE: "free", OP_GET: "get"}
+
+TraceRecord = namedtuple("TraceRecord", ["timestamp", "op", "object_id", "size"])
+
+
+class TraceRecorder:
+    """
+    Stream allocation requests into a binary trace file.
+
+    ``record`` only appends a tuple to an in-memory batch; full batches are
+    packed and written by a background thread.
+
+    Parameters
+    ----------
+    path : str
+        The file the trace is written to. An existing file is overwritten.
+    batch_size : int, optional
+        The number of records handed to the writer thread at a time.
+    """
+
+    def __init__(self, path: str, batch_size: int = 4096) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.records_written = 0
+        self._batch = []
+        self._queue = queue.SimpleQueue()
+        self._start = time.monotonic_ns()
+        self._file = open(path, "wb")  # pylint: disable=consider-using-with
+        self._file.write(TRACE_MAGIC)
+        self.closed = False
+        self._writer = threading.Thread(target=self._write_batches,
+                                        name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, op: int, object_id: str, size: int = 0) -> None:
+        """
+        Record a request made to the memory manager.
+
+        Parameters
+        ----------
+        op : int
+            One of OP_ALLOCATE, OP_FREE or OP_GET.
+        object_id : str
+            The SHA-256 hex identifier of the object.
+        size : int, optional
+            The size of the object in bytes, for allocations.
+        """
+        self._batch.append((time.monotonic_ns() - self._start, op, object_id, size))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the current batch to the writer thread."""
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        """Write all pending records and close the trace file."""
+        if self.closed:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _write_batches(self) -> None:
+        pack = RECORD.pack
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            self._file.write(b"".join(
+                pack(timestamp, op, bytes.fromhex(object_id), size)
+                for timestamp, op, object_id, size in batch))
+            self.records_written += len(batch)
+        self._file.flush()
+
+
+def read_trace(path: str, chunk_records: int = 4096):
+    """
+    Read the records of a trace file.
+
+    Parameters
+    ----------
+    path : str
+        The trace file to read.
+    chunk_records : int, optional
+        The number of records read from disk at a time.
+
+    Yields
+    ------
+    TraceRecord
+        The recorded requests in order, with object_id as a hex string.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a trace file.
+    """
+    with open(path, "rb") as trace_file:
+        if trace_file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a memory manager trace file.")
+        while True:
+            chunk = trace_file.read(RECORD.size * chunk_records)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for timestamp, op, object_id, size in RECORD.iter_unpack(chunk[:usable]):
+                yield TraceRecord(timestamp, op, object_id.hex(), size)
+
+
+def synthetic_object(object_id: str, size: int) -> str:
+    """
+    Build a stand-in object for a recorded object.
+
+    The result is a string that starts with the recorded object_id, so it is
+    unique per recorded object, and is padded so that its deep size matches
+    the recorded size where possible. It is always longer than a bare
+    object_id so that it is never mistaken for one.
+
+    Parameters
+    ----------
+    object_id : str
+        The recorded object_id.
+    size : int
+        The recorded size of the object in bytes.
+
+    Returns
+    -------
+    str
+        The stand-in object.
+    """
+    length = max(size - sys.getsizeof(""), len(object_id) + 1)
+    return object_id + "." * (length - len(object_id))
+
+
+def load_workload(path: str) -> list:
+    """
+    Convert a trace file into a workload of ``(op, obj)`` pairs.
+
+    The workload can be passed to ``replay_workload`` or
+    ``helpers.placement.compare_policies``.
+
+    Parameters
+    ----------
+    path : str
+        The trace file to read.
+
+    Returns
+    -------
+    list of tuple
+        The recorded requests with synthetic objects in place of the originals.
+    """
+    objects = {}
+    workload = []
+    for record in read_trace(path):
+        obj = objects.get(record.object_id)
+        if obj is None:
+            obj = synthetic_object(record.object_id, record.size)
+            objects[record.object_id] = obj
+        workload.append((OP_NAMES[record.op], obj))
+    return workload
+
+
+def replay_trace(path: str, memory_manager) -> dict:
+    """
+    Replay a trace file against a memory manager as fast as possible.
+
+    The trace is fully loaded before the clock starts and INFO logging of the
+    memory manager is suppressed during the replay.
+
+    Parameters
+    ----------
+    path : str
+        The trace file to replay.
+    memory_manager : MemManager
+        The memory manager that executes the requests.
+
+    Returns
+    -------
+    dict
+        The number of operations, elapsed seconds and operations per second.
+    """
+    workload = load_workload(path)
+    with quiet_logging():
+        start = time.perf_counter()
+        operations = replay_workload(memory_manager, workload)
+        elapsed = time.perf_counter() - start
+    return {
+        "operations": operations,
+        "seconds": elapsed,
+        "ops_per_second": operations / elapsed if elapsed else float("inf"),
+    }
+
+
+def main(argv=None) -> None:
+    """Command line entry point for replaying traces."""
+    from memorymanager import MemManager  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser(
+        "replay", help="Replay a trace against a fresh MemManager.")
+    replay_parser.add_argument("trace", help="The trace file to replay.")
+    replay_parser.add_argument("--db", default="sqlite://",
+                               help="The database URL of the fresh MemManager.")
+    replay_parser.add_argument("--placement", default="first-fit",
+                               help="The placement policy of the fresh MemManager.")
+    args = parser.parse_args(argv)
+
+    memory_manager = MemManager(args.db, placement=args.placement)
+    stats = replay_trace(args.trace, memory_manager)
+    print(f"Replayed {stats['operations']} operations in {stats['seconds']:.3f} s "
+          f"({stats['ops_per_second']:.0f} ops/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,56 @@ import json
 import hashlib
 import re
 import logging
-from sqlalchemy import create_engine, func
+import threading
+from functools import wraps
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
-from database_models import Base, MemRam, Arena, Pool, Block, Ledger, StoredObject
+from database_models import Base, MemRam, Arena, Pool, Block, Ledger, StoredObject, \
+    upgrade_schema
 import helpers.listeners  # pylint: disable=unused-import
+from helpers.sizing import get_sizer
+from helpers.placement import get_policy
+from helpers.trace import OP_ALLOCATE, OP_FREE, OP_GET
+from helpers.analytics import memory_report
+from helpers.maintenance import ReserveMaintainer
+from helpers.postgres import PostgresAllocator, get_engine_options
+from helpers.generations import GenerationalCollector
+from helpers.eviction import get_eviction_policy
+from helpers.shared import SharedMemoryAllocator
+from helpers.profiling import NULL_PROFILER, Profiler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def synchronized(method):
+    """
+    Run a MemManager method while holding the manager's lock.
+
+    The lock keeps the placement indexes consistent when a ReserveMaintainer
+    adds or trims blocks from its background thread.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def profiled(name):
+    """
+    Time each call of a MemManager method as a span of the manager's profiler.
+
+    With profiling off the span is a shared no-op object.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
 class MemManager:
     """
     Memory Manager class for managing memory allocation and deallocation.
@@ -24,9 +64,31 @@ class MemManager:
     ----------
     db_url : str
         The database URL for connecting to the SQLite database.
+    sizer : str or Sizer, optional
+        The size estimator used to bill objects ("deep", "shallow" or
+        "serialized", or a Sizer instance). Defaults to "deep".
+    placement : str or PlacementPolicy, optional
+        The placement policy deciding which block receives an allocation
+        ("first-fit", "next-fit", "best-fit" or "buddy", or a PlacementPolicy
+        instance). Defaults to "first-fit".
+    trace_recorder : TraceRecorder, optional
+        Records every allocate, free and get request for offline replay.
+    engine_options : dict, optional
+        Extra create_engine options, e.g. connection pool settings. PostgreSQL
+        URLs get the pool defaults from helpers/postgres.py.
+    max_mem : int, optional
+        The capacity of the MemRam in bytes. Defaults to the MemRam default.
+    shared_memory : str, optional
+        The name of a shared-memory segment. Processes on one host that use
+        the same name allocate from the segment in parallel, and the database
+        only receives snapshots of the ledger and stored objects.
+    profiler : Profiler, optional
+        Records timing spans around the allocator's hot paths.
     """
 
-    def __init__(self, db_url: str) -> None:
+    def __init__(self, db_url: str, sizer="deep", placement="first-fit",
+                 trace_recorder=None, engine_options=None, max_mem: int = None,
+                 shared_memory: str = None, profiler=None) -> None:
         """
         Initialize the memory manager with a SQLite database URL.
 
@@ -34,41 +96,89 @@ class MemManager:
         ----------
         db_url : str
             The database URL for connecting to the SQLite database.
+        sizer : str or Sizer, optional
+            The size estimator used to bill objects. Defaults to "deep".
+        placement : str or PlacementPolicy, optional
+            The placement policy for new allocations. Defaults to "first-fit".
+        trace_recorder : TraceRecorder, optional
+            Records every allocate, free and get request for offline replay.
+        engine_options : dict, optional
+            Extra create_engine options, e.g. connection pool settings.
+        max_mem : int, optional
+            The capacity of the MemRam in bytes.
+        shared_memory : str, optional
+            The name of a shared-memory segment to allocate from.
+        profiler : Profiler, optional
+            Records timing spans around the allocator's hot paths.
         """
+        self.sizer = get_sizer(sizer)
+        self.placement = get_policy(placement)
+        if shared_memory is None and db_url.startswith("postgresql") and \
+                self.placement.name != PostgresAllocator.placement:
+            raise ValueError(f"The PostgreSQL backend only supports "
+                             f"{PostgresAllocator.placement!r} placement.")
+        self.placements = {0: self.placement}
+        self.trace_recorder = trace_recorder
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.lock = threading.RLock()
+        self.maintainer = None
+        self.generations = None
+        self.eviction = None
+        self.high_watermark = 1.0
+        self.low_watermark = 1.0
+        self.pressure_callbacks = []
         try:
-            self.engine = create_engine(db_url)
+            self.engine = create_engine(db_url, **get_engine_options(db_url, engine_options))
             Base.metadata.create_all(self.engine)
+            upgrade_schema(self.engine)
             session = sessionmaker(bind=self.engine)
             self.session = session()
 
             # Skapa en ny MemRam-post
-            self.memram = MemRam()
+            self.memram = MemRam() if max_mem is None else MemRam(max_mem)
             self.session.add(self.memram)
             self.session.commit()
+
+            # PostgreSQL allocates with set-based statements that are safe
+            # under concurrent writers
+            self.backend = None
+            if shared_memory is not None:
+                self.backend = SharedMemoryAllocator(self.engine, shared_memory, max_mem)
+            elif self.engine.dialect.name == "postgresql":
+                self.backend = PostgresAllocator(self.engine, self.memram.id)
+
+            # Index the free space of any existing arenas, pools and blocks
+            self.rebuild_placements()
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error initializing MemManager: %s", exc)
             raise
 
-    def add_arena(self) -> Arena:
+    @synchronized
+    def add_arena(self, generation: int = 0) -> Arena:
         """
         Create a new arena and add it to the MemRam table.
 
+        Parameters
+        ----------
+        generation : int, optional
+            The generation the arena belongs to. Defaults to 0 (young).
+
         Returns
         -------
         Arena
             The newly created Arena object.
         """
         try:
-            new_arena = Arena()
-            new_arena.memram = self.memram
-            self.session.add(new_arena)
+            new_arena = self._new_arena(generation)
             self.session.commit()
             return new_arena
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error adding arena: %s", exc)
             self.session.rollback()
+            self.rebuild_placements()
             raise
 
+    @synchronized
     def add_pool(self, target_arena: Arena) -> Pool:
         """
         Create a new pool and add it to the arena table.
@@ -84,16 +194,16 @@ class MemManager:
             The newly created Pool object.
         """
         try:
-            new_pool = Pool()
-            new_pool.arena = target_arena
-            self.session.add(new_pool)
+            new_pool = self._new_pool(target_arena)
             self.session.commit()
             return new_pool
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error adding pool: %s", exc)
             self.session.rollback()
+            self.rebuild_placements()
             raise
 
+    @synchronized
     def add_block(self, target_pool: Pool) -> Block:
         """
         Create a new block and add it to the pool table.
@@ -109,16 +219,51 @@ class MemManager:
             The newly created Block object.
         """
         try:
-            new_block = Block()
-            new_block.pool = target_pool
-            self.session.add(new_block)
+            new_block = self._new_block(target_pool)
             self.session.commit()
             return new_block
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error adding block: %s", exc)
             self.session.rollback()
+            self.rebuild_placements()
             raise
 
+    # The _new_* helpers flush a new row and index it without committing, so
+    # that callers can create several rows in one transaction. A caller that
+    # rolls back has to rebuild the placement indexes.
+
+    @profiled("add_arena")
+    def _new_arena(self, generation: int = 0) -> Arena:
+        new_arena = Arena()
+        new_arena.memram = self.memram
+        new_arena.generation = generation
+        self.session.add(new_arena)
+        self.session.flush()
+        self.placement_for(generation).add_arena(new_arena.id,
+                                                 new_arena.max_mem - new_arena.mem)
+        return new_arena
+
+    @profiled("add_pool")
+    def _new_pool(self, target_arena: Arena) -> Pool:
+        new_pool = Pool()
+        new_pool.arena = target_arena
+        self.session.add(new_pool)
+        self.session.flush()
+        self.placement_for(target_arena.generation or 0).add_pool(
+            new_pool.id, target_arena.id, new_pool.max_mem - new_pool.mem)
+        return new_pool
+
+    @profiled("add_block")
+    def _new_block(self, target_pool: Pool) -> Block:
+        new_block = Block()
+        new_block.pool = target_pool
+        self.session.add(new_block)
+        self.session.flush()
+        self._placement_of_pool(target_pool.id).add_block(
+            new_block.id, target_pool.id, new_block.max_mem, new_block.mem)
+        return new_block
+
+    @profiled("hashing")
     def generate_object_id(self, identifier):
         """
         Generate a consistent object_id for a given identifier.
@@ -144,6 +289,8 @@ class MemManager:
         serialized_obj = json.dumps(identifier, sort_keys=True)
         return hashlib.sha256(serialized_obj.encode('utf-8')).hexdigest()
 
+    @profiled("allocate_memory_for_object")
+    @synchronized
     def allocate_memory_for_object(self, obj_instance) -> None:
         """
         Allocate memory for an object by creating necessary arenas, pools, and blocks.
@@ -159,53 +306,86 @@ class MemManager:
             If there is not enough memory to allocate the object.
         """
         try:
-            obj_size = obj_instance.__sizeof__()
-
             # Create a unique and consistent identifier for the object
             object_id = self.generate_object_id(obj_instance)
 
+            # A stored object needs no sizing unless the trace wants its size
+            duplicate = self.backend is None and self.is_object_stored(object_id)
+            if duplicate and self.trace_recorder is None:
+                self._touch_duplicate(object_id)
+                return
+
+            # Sizes are cached by object_id, so a traced duplicate is walked once
+            with self.profiler.span("sizing"):
+                obj_size = self.sizer(obj_instance, object_id)
+
+            if self.trace_recorder is not None:
+                self.trace_recorder.record(OP_ALLOCATE, object_id, obj_size)
+
+            if duplicate:
+                self._touch_duplicate(object_id)
+                return
+
             if self.memram.max_mem < obj_size:
                 raise MemoryError("Not enough memory to allocate object.")
 
-            remaining_size = obj_size
-            blocks_to_update = []
-
-            # Check if the object is already stored
-            if self.is_object_stored(object_id):
-                logger.info("Object with identifier %s already exists in the database.", object_id)
+            if self.backend is not None:
+                with self.profiler.span("backend"):
+                    allocated = self.backend.allocate(object_id, obj_instance, obj_size)
+                if allocated:
+                    logger.info("Allocated %d bytes for object with identifier %s.",
+                                obj_size, object_id)
+                else:
+                    logger.info("Object with identifier %s already exists in the database.",
+                                object_id)
                 return
 
+            # Evict objects if the allocation would cross the high watermark
+            with self.profiler.span("eviction"):
+                self.make_room(obj_size)
+
             logger.info("Object with identifier %s stored in the database.", object_id)
 
             # Store the object in the StoredObject table
             self.store_object(object_id, obj_instance)
 
             # Get blocks that have enough space for the object
-            while remaining_size > 0:
-                suitable_block = self.find_suitable_block()
-
-                if suitable_block:
-                    remaining_size = \
-                        self.allocate_to_block(suitable_block, remaining_size,\
-                                                blocks_to_update, object_id)
-                else:
-                    remaining_size = \
-                    self.allocate_to_new_block(remaining_size,\
-                                                blocks_to_update, object_id)
+            blocks_to_update = self.allocate_blocks_for_object(object_id, obj_size)
 
             # Batch commit
-            self.session.bulk_save_objects(blocks_to_update)
-            self.session.commit()
+            with self.profiler.span("commit"):
+                self.session.bulk_save_objects(blocks_to_update)
+                self.session.commit()
 
             logger.info("Allocated %d bytes for object across multiple blocks.", obj_size)
+
+            if self.eviction is not None:
+                self.eviction.insert(object_id)
+            if self.generations is not None:
+                self.generations.on_allocate()
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error allocating memory for object: %s", exc)
             self.session.rollback()
+            self.rebuild_placements()
             raise
         except MemoryError as exc:  # pylint: disable=redefined-outer-name
             logger.error("MemoryError: %s", exc)
             raise
 
+    def _touch_duplicate(self, object_id: str) -> None:
+        """
+        Record an allocation of an object that is already stored.
+
+        Parameters
+        ----------
+        object_id : str
+            The identifier of the stored object.
+        """
+        logger.info("Object with identifier %s already exists in the database.", object_id)
+        if self.eviction is not None:
+            self.eviction.access(object_id)
+
+    @profiled("duplicate_check")
     def is_object_stored(self, object_id: str) -> bool:
         """
         Check if the object is already stored in the database.
@@ -224,6 +404,7 @@ class MemManager:
             StoredObject.object_id == object_id).first()
         return stored_object is not None
 
+    @profiled("store_object")
     def store_object(self, object_id: str, obj_instance: object) -> None:
         """
         Store the object in the StoredObject table.
@@ -239,20 +420,85 @@ class MemManager:
         self.session.add(stored_object)
         self.session.commit()
 
-    def find_suitable_block(self) -> Block:
+    def allocate_blocks_for_object(self, object_id: str, size: int,
+                                   generation: int = 0) -> list:
+        """
+        Spread an allocation over existing and new blocks of a generation.
+
+        New arenas, pools and blocks are flushed, and no changes are
+        committed.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+        size : int
+            The number of bytes to allocate.
+        generation : int, optional
+            The generation that receives the allocation. Defaults to 0 (young).
+
+        Returns
+        -------
+        list
+            The blocks that received part of the allocation.
+        """
+        remaining_size = size
+        blocks_to_update = []
+        while remaining_size > 0:
+            suitable_block = self.find_suitable_block(remaining_size, generation)
+
+            if suitable_block:
+                remaining_size = \
+                    self.allocate_to_block(suitable_block, remaining_size,\
+                                            blocks_to_update, object_id)
+            else:
+                remaining_size = \
+                self.allocate_to_new_block(remaining_size,\
+                                            blocks_to_update, object_id, generation)
+        return blocks_to_update
+
+    @profiled("placement")
+    def find_suitable_block(self, size: int = 1, generation: int = 0) -> Block:
         """
         Find a suitable block that has enough space for the object.
 
+        The block is chosen by the placement policy from its in-memory index.
+        Its free bytes are checked against the database first. If another
+        manager has written to the block, the indexes are rebuilt and the
+        block is chosen again.
+
+        Parameters
+        ----------
+        size : int, optional
+            The number of bytes that still have to be allocated.
+        generation : int, optional
+            The generation whose blocks are searched. Defaults to 0 (young).
+
         Returns
         -------
         Block
             A block that has enough space for the object, or None if no suitable block is found.
         """
-        return self.session.query(Block).filter(
-            Block.is_free == 1,
-            Block.max_mem - Block.mem > 0
-        ).first()
+        placement = self.placement_for(generation)
+        block_id = placement.find_block(size)
+        if block_id is None:
+            return None
+        # The select flushes this manager's own changes before reading
+        mem = self.session.scalar(select(Block.mem).where(Block.id == block_id))
+        if mem is not None and placement.block_free[block_id] == \
+                placement.block_capacity[block_id] - mem:
+            return self.session.get(Block, block_id)
+
+        logger.info("Block %s was changed by another writer, rebuilding the indexes.",
+                    block_id)
+        self.session.expire_all()
+        self.rebuild_placements()
+        block_id = placement.find_block(size)
+        if block_id is None:
+            return None
+        return self.session.get(Block, block_id)
 
+    @profiled("allocate_to_block")
     def allocate_to_block(self, target_block: Block, remaining_size: int,
                         target_blocks_to_update: list, object_id: str) -> int:
         """
@@ -274,27 +520,29 @@ class MemManager:
         int
             The remaining size of the object to be allocated.
         """
-        available_space = target_block.max_mem - target_block.mem
-        to_allocate = min(remaining_size, available_space)
+        to_allocate, charged = self._placement_of_block(target_block.id).charge(
+            target_block.id, remaining_size, object_id)
 
-        target_block.mem += to_allocate
+        target_block.mem += charged
         target_block.is_free = 0 if target_block.mem == target_block.max_mem else 1
         remaining_size -= to_allocate
         target_blocks_to_update.append(target_block)
 
-        ledger_entry = Ledger(
-            arena_id=target_block.pool.arena_id,
-            pool_id=target_block.pool_id,
-            block_id=target_block.id,
-            object_id=object_id,
-            allocated_mem=to_allocate
-        )
-        self.session.add(ledger_entry)
+        with self.profiler.span("ledger_write"):
+            ledger_entry = Ledger(
+                arena_id=target_block.pool.arena_id,
+                pool_id=target_block.pool_id,
+                block_id=target_block.id,
+                object_id=object_id,
+                allocated_mem=charged
+            )
+            self.session.add(ledger_entry)
 
         return remaining_size
 
-    def allocate_to_new_block(self, remaining_size: int,
-                            blocks_to_update: list, object_id: str) -> int:
+    @profiled("allocate_to_new_block")
+    def allocate_to_new_block(self, remaining_size: int, blocks_to_update: list,
+                              object_id: str, generation: int = 0) -> int:
         """
         Allocate part of the object to a new block in a new pool and arena if necessary.
 
@@ -306,44 +554,51 @@ class MemManager:
             The list of blocks to be updated.
         object_id : str
             The unique identifier of the object.
+        generation : int, optional
+            The generation of the arena that receives the block. Defaults to 0.
 
         Returns
         -------
         int
             The remaining size of the object to be allocated.
         """
-        new_arena = self.session.query(Arena).filter(
-            Arena.max_mem - Arena.mem > 0).first()
-        if not new_arena:
-            new_arena = self.add_arena()
+        placement = self.placement_for(generation)
+        with self.profiler.span("placement"):
+            arena_id = placement.find_arena()
+            if arena_id is None:
+                new_arena = self._new_arena(generation)
+            else:
+                new_arena = self.session.get(Arena, arena_id)
 
-        new_pool = self.session.query(Pool).filter(
-            Pool.arena_id == new_arena.id,
-            Pool.max_mem - Pool.mem > 0).first()
-        if not new_pool:
-            new_pool = self.add_pool(new_arena)
+            pool_id = placement.find_pool(new_arena.id)
+            if pool_id is None:
+                new_pool = self._new_pool(new_arena)
+            else:
+                new_pool = self.session.get(Pool, pool_id)
 
-        new_block = self.add_block(new_pool)
+            new_block = self._new_block(new_pool)
 
-        available_space = new_block.max_mem - new_block.mem
-        to_allocate = min(remaining_size, available_space)
+            to_allocate, charged = placement.charge(new_block.id, remaining_size, object_id)
 
-        new_block.mem += to_allocate
+        new_block.mem += charged
         new_block.is_free = 0 if new_block.mem == new_block.max_mem else 1
         remaining_size -= to_allocate
         blocks_to_update.append(new_block)
 
-        ledger_entry = Ledger(
-            arena_id=new_block.pool.arena_id,
-            pool_id=new_block.pool_id,
-            block_id=new_block.id,
-            object_id=object_id,
-            allocated_mem=to_allocate
-        )
-        self.session.add(ledger_entry)
+        with self.profiler.span("ledger_write"):
+            ledger_entry = Ledger(
+                arena_id=new_block.pool.arena_id,
+                pool_id=new_block.pool_id,
+                block_id=new_block.id,
+                object_id=object_id,
+                allocated_mem=charged
+            )
+            self.session.add(ledger_entry)
 
         return remaining_size
 
+    @profiled("free_memory_for_object")
+    @synchronized
     def free_memory_for_object(self, identifier) -> None:
         """
         Free memory for an object by updating the ledger and blocks.
@@ -357,36 +612,325 @@ class MemManager:
             # Generate the object_id from the identifier
             object_id = self.generate_object_id(identifier)
 
-            logger.info("Freeing memory for object with identifier: %s", object_id)
-
-            # Get all ledger entries for the given object_id
-            ledger_entries = self.session.query(Ledger).filter(
-                Ledger.object_id == object_id).all()
+            if self.trace_recorder is not None:
+                self.trace_recorder.record(OP_FREE, object_id)
 
-            for ledger_entry in ledger_entries:
-                # Get the corresponding block
-                target_block = self.session.query(Block).filter(
-                    Block.id == ledger_entry.block_id).first()
+            logger.info("Freeing memory for object with identifier: %s", object_id)
 
-                if target_block:
-                    allocated_mem = ledger_entry.allocated_mem
-                    target_block.mem -= allocated_mem
-                    # Mark the block as dirty to trigger the listener
-                    target_block.is_free = 0 if target_block.mem == target_block.max_mem else 1
+            if self.backend is not None:
+                with self.profiler.span("backend"):
+                    self.backend.free(object_id)
+                logger.info("Freed memory for object with identifier: %s", object_id)
+                return
 
-            # Delete all ledger entries for the given object_id
-            self.session.query(Ledger).filter(Ledger.object_id == object_id).delete()
-            self.session.query(StoredObject).filter(StoredObject.object_id == object_id).delete()
+            freed = self.release_object(object_id)
 
             # Save the changes
-            self.session.commit()
+            with self.profiler.span("commit"):
+                self.session.commit()
 
             logger.info("Freed memory for object with identifier: %s", object_id)
+
+            if self.eviction is not None:
+                self.eviction.remove(object_id)
+            if self.generations is not None and freed:
+                self.generations.on_free()
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error freeing memory for object: %s", exc)
             self.session.rollback()
+            self.rebuild_placements()
             raise
 
+    def placement_for(self, generation: int = 0):
+        """
+        Return the placement policy indexing the arenas of a generation.
+
+        Parameters
+        ----------
+        generation : int, optional
+            The generation. Defaults to 0 (young).
+
+        Returns
+        -------
+        PlacementPolicy
+            The policy of the generation, created on first use.
+        """
+        placement = self.placements.get(generation)
+        if placement is None:
+            placement = self.placement.empty_copy()
+            self.placements[generation] = placement
+        return placement
+
+    def _placement_of_block(self, block_id: int):
+        for placement in self.placements.values():
+            if block_id in placement.block_free:
+                return placement
+        return self.placement
+
+    def _placement_of_pool(self, pool_id: int):
+        for placement in self.placements.values():
+            if pool_id in placement.pool_free:
+                return placement
+        return self.placement
+
+    def rebuild_placements(self) -> None:
+        """
+        Reload the placement indexes from the database.
+
+        In generational mode every generation is indexed by its own policy.
+        """
+        if self.generations is None:
+            self.placement.rebuild(self.session)
+            return
+        for generation, placement in self.placements.items():
+            placement.rebuild(self.session, generation)
+
+    @synchronized
+    def enable_generations(self, thresholds=(700, 10, 10)) -> GenerationalCollector:
+        """
+        Switch to generational allocation, modeled on CPython's gc generations.
+
+        New objects are allocated in young arenas. Collections promote the
+        objects still allocated to older arenas, so short-lived and long-lived
+        objects no longer share blocks.
+
+        Parameters
+        ----------
+        thresholds : tuple of int, optional
+            The collection threshold of every generation, as in gc.set_threshold.
+
+        Returns
+        -------
+        GenerationalCollector
+            The collector, with per-generation counts and statistics.
+
+        Raises
+        ------
+        ValueError
+            If the PostgreSQL backend is in use.
+        """
+        if self.backend is not None:
+            raise ValueError(f"Generational mode is not supported by the "
+                             f"{self.backend.name} backend.")
+        self.generations = GenerationalCollector(self, thresholds)
+        for generation in range(len(thresholds)):
+            self.placement_for(generation)
+        self.rebuild_placements()
+        return self.generations
+
+    @synchronized
+    def collect(self, generation: int = None) -> dict:
+        """
+        Run a generational collection.
+
+        Parameters
+        ----------
+        generation : int, optional
+            The oldest generation to collect. Defaults to the oldest one.
+
+        Returns
+        -------
+        dict
+            The number of objects and bytes promoted and blocks reclaimed.
+
+        Raises
+        ------
+        ValueError
+            If generational mode is not enabled.
+        """
+        if self.generations is None:
+            raise ValueError("Generational mode is not enabled.")
+        return self.generations.collect(generation)
+
+    @profiled("ledger_write")
+    def release_object(self, object_id: str) -> int:
+        """
+        Return the blocks of an object and delete it, without committing.
+
+        Parameters
+        ----------
+        object_id : str
+            The unique identifier of the object.
+
+        Returns
+        -------
+        int
+            The number of bytes released.
+        """
+        # Get all ledger entries for the given object_id
+        ledger_entries = self.session.query(Ledger).filter(
+            Ledger.object_id == object_id).all()
+
+        freed = 0
+        for ledger_entry in ledger_entries:
+            # Get the corresponding block
+            target_block = self.session.query(Block).filter(
+                Block.id == ledger_entry.block_id).first()
+
+            if target_block:
+                allocated_mem = ledger_entry.allocated_mem
+                target_block.mem -= allocated_mem
+                # Mark the block as dirty to trigger the listener
+                target_block.is_free = 0 if target_block.mem == target_block.max_mem else 1
+                self._placement_of_block(target_block.id).release(
+                    target_block.id, allocated_mem, object_id)
+                freed += allocated_mem
+
+        # Delete all ledger entries for the given object_id
+        self.session.query(Ledger).filter(Ledger.object_id == object_id).delete()
+        self.session.query(StoredObject).filter(StoredObject.object_id == object_id).delete()
+        return freed
+
+    def used_memory(self) -> int:
+        """
+        Return the exact number of bytes allocated in blocks.
+
+        The count comes from the placement indexes. Writes by another manager
+        sharing the database are only included once an allocation finds a
+        changed block, or after ``rebuild_placements``.
+        """
+        return sum(placement.used for placement in self.placements.values())
+
+    def free_memory(self) -> int:
+        """Return the number of bytes that can still be allocated, see ``used_memory``."""
+        return self.memram.max_mem - self.used_memory()
+
+    @synchronized
+    def set_eviction_policy(self, policy="lru", high_watermark: float = 0.95,
+                            low_watermark: float = 0.8):
+        """
+        Evict objects in bulk instead of failing when memory runs out.
+
+        When an allocation would push the used memory above ``high_watermark``
+        of max_mem, objects are evicted in the policy's order until it is back
+        at ``low_watermark``, leaving room for the new object.
+
+        Parameters
+        ----------
+        policy : str or EvictionPolicy, optional
+            "lru" or "lfu" (by ``get_object`` access), "ttl", or an
+            EvictionPolicy instance. Defaults to "lru".
+        high_watermark : float, optional
+            The share of max_mem above which eviction starts.
+        low_watermark : float, optional
+            The share of max_mem eviction brings the used memory down to.
+
+        Returns
+        -------
+        EvictionPolicy
+            The policy, already tracking the stored objects.
+
+        Raises
+        ------
+        ValueError
+            If the watermarks are out of order or the PostgreSQL backend is in use.
+        """
+        if self.backend is not None:
+            raise ValueError(f"Eviction is not supported by the {self.backend.name} backend.")
+        if not 0 <= low_watermark <= high_watermark <= 1:
+            raise ValueError("Watermarks must satisfy 0 <= low <= high <= 1.")
+        self.eviction = get_eviction_policy(policy)
+        self.eviction.rebuild(self.session)
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        return self.eviction
+
+    def add_pressure_callback(self, callback) -> None:
+        """
+        Register a function called when an allocation crosses the high watermark.
+
+        Parameters
+        ----------
+        callback : callable
+            Called as ``callback(memory_manager, bytes_needed)`` before any
+            object is evicted. It may free objects itself.
+        """
+        self.pressure_callbacks.append(callback)
+
+    def remove_pressure_callback(self, callback) -> None:
+        """Unregister a memory pressure callback."""
+        self.pressure_callbacks.remove(callback)
+
+    def make_room(self, size: int) -> None:
+        """
+        Make room for an allocation if it would cross the high watermark.
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes about to be allocated. The check uses the
+            size the placement policy will charge for them.
+
+        Raises
+        ------
+        MemoryError
+            If the allocation does not fit even after the pressure callbacks
+            and eviction ran.
+        """
+        max_mem = self.memram.max_mem
+        # The placement policy may charge more than the object's size
+        size = self.placement.charged_size(size)
+        if self.used_memory() + size <= self.high_watermark * max_mem:
+            return
+
+        target = max(int(self.low_watermark * max_mem) - size, 0)
+        logger.info("Memory pressure: %d bytes used, %d requested.", self.used_memory(), size)
+        for callback in list(self.pressure_callbacks):
+            callback(self, self.used_memory() - target)
+        if self.eviction is not None and self.used_memory() > target:
+            self.evict(self.used_memory() - target)
+
+        if self.used_memory() + size > max_mem:
+            raise MemoryError("Not enough free memory to allocate object.")
+
+    @profiled("evict")
+    @synchronized
+    def evict(self, size: int) -> list:
+        """
+        Evict objects in the eviction policy's order in one transaction.
+
+        Expired objects are always evicted, then further victims until at
+        least ``size`` bytes are released.
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes to release.
+
+        Returns
+        -------
+        list of str
+            The object_ids of the evicted objects.
+        """
+        if self.eviction is None:
+            raise ValueError("No eviction policy is set.")
+        evicted = self.eviction.expired()
+        freed = 0
+        try:
+            for object_id in evicted:
+                freed += self.release_object(object_id)
+            expired = set(evicted)
+            for object_id in self.eviction.victims():
+                if freed >= size:
+                    break
+                if object_id in expired:
+                    continue
+                freed += self.release_object(object_id)
+                evicted.append(object_id)
+            self.session.commit()
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error evicting objects: %s", exc)
+            self.session.rollback()
+            self.rebuild_placements()
+            raise
+
+        for object_id in evicted:
+            self.eviction.remove(object_id)
+            if self.generations is not None:
+                self.generations.on_free()
+        logger.info("Evicted %d objects, %d bytes.", len(evicted), freed)
+        return evicted
+
     def print_memory_statistics(self):
         """
         Print memory usage statistics.
@@ -410,6 +954,43 @@ class MemManager:
             logger.error("Error printing memory statistics: %s", exc)
             raise
 
+    def memory_report(self, bins: int = 10) -> dict:
+        """
+        Compute and log utilization and fragmentation reports.
+
+        The tables are bulk-loaded into NumPy arrays, see helpers/analytics.py.
+
+        Parameters
+        ----------
+        bins : int, optional
+            The number of bins of the block fill level histogram.
+
+        Returns
+        -------
+        dict
+            The fill histogram, pool, arena, object size and fragmentation reports.
+        """
+        try:
+            report = memory_report(self.engine, bins)
+        except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
+            logger.error("Error computing memory report: %s", exc)
+            raise
+
+        fragmentation = report["fragmentation"]
+        objects = report["objects"]
+        logger.info("Block fill histogram: %s", report["fill_histogram"]["counts"].tolist())
+        logger.info("Blocks: %d empty, %d partial, %d full; fragmentation %.1f%%",
+                    fragmentation["empty_blocks"], fragmentation["partial_blocks"],
+                    fragmentation["full_blocks"], fragmentation["fragmentation"] * 100)
+        if len(report["pools"]["id"]):
+            logger.info("Mean pool utilization: %.1f%%, mean arena utilization: %.1f%%",
+                        report["pools"]["utilization"].mean() * 100,
+                        report["arenas"]["utilization"].mean() * 100)
+        logger.info("Objects: %d, mean size %.0f bytes, %.2f blocks per object",
+                    objects["objects"], objects["mean"], fragmentation["blocks_per_object"])
+        return report
+
+    @profiled("get_object")
     def get_object(self, identifier):
         """
         Retrieve an object from the database using its identifier.
@@ -428,11 +1009,23 @@ class MemManager:
             # Generate the object_id from the identifier
             object_id = self.generate_object_id(identifier)
 
+            if self.trace_recorder is not None:
+                self.trace_recorder.record(OP_GET, object_id)
+
+            # Objects not yet snapshotted only exist in this process
+            if isinstance(self.backend, SharedMemoryAllocator) and \
+                    object_id in self.backend.pending:
+                logger.info("Object with identifier %s retrieved from shared memory.",
+                            object_id)
+                return self.backend.pending[object_id][0]
+
             # Query the StoredObject table for the object
             stored_object = self.session.query(StoredObject).filter(
                 StoredObject.object_id == object_id).first()
 
             if stored_object:
+                if self.eviction is not None:
+                    self.eviction.access(object_id)
                 logger.info("Object with identifier %s retrieved from the database.",
                             object_id)
                 return stored_object.object_data
@@ -442,12 +1035,15 @@ class MemManager:
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error retrieving object: %s", exc)
             raise
+    @synchronized
     def manual_garbage_collection(self) -> None:
         """
         Remove all unused blocks, pools, and arenas.
 
         This method identifies and removes blocks that are not used,
-        pools that are empty, and arenas that are empty.
+        pools that are empty, and arenas that are empty. While reserve
+        maintenance runs, the empty blocks, pools and arenas of its reserve
+        are kept.
 
         Raises
         ------
@@ -455,33 +1051,122 @@ class MemManager:
             If there is an error during the removal of unused resources.
         """
         try:
+            reserved_blocks, reserved_pools, reserved_arenas = [], [], []
+            if self.maintainer is not None:
+                reserved_blocks, reserved_pools, reserved_arenas = \
+                    self.maintainer.reserved(self.session)
+
             # Remove unused blocks
             unused_blocks = self.session.query(Block).\
-                filter(Block.is_free == 1, Block.mem == 0).all()
+                filter(Block.is_free == 1, Block.mem == 0, Block.id.not_in(reserved_blocks)).all()
             for target_block in unused_blocks:
                 self.session.delete(target_block)
                 logger.info("Removed unused block with ID: %d", target_block.id)
 
             # Remove empty pools
-            empty_pools = self.session.query(Pool).filter(~Pool.blocks.any()).all()
+            empty_pools = self.session.query(Pool).\
+                filter(~Pool.blocks.any(), Pool.id.not_in(reserved_pools)).all()
             for target_pool in empty_pools:
                 self.session.delete(target_pool)
                 logger.info("Removed empty pool with ID: %d", target_pool.id)
 
             # Remove empty arenas
-            empty_arenas = self.session.query(Arena).filter(~Arena.pools.any()).all()
+            empty_arenas = self.session.query(Arena).\
+                filter(~Arena.pools.any(), Arena.id.not_in(reserved_arenas)).all()
             for target_arena in empty_arenas:
                 self.session.delete(target_arena)
                 logger.info("Removed empty arena with ID: %d", target_arena.id)
 
             # Save the changes
             self.session.commit()
+            self.rebuild_placements()
             logger.info("Removed all unused resources.")
         except SQLAlchemyError as exc:  # pylint: disable=redefined-outer-name
             logger.error("Error removing unused resources: %s", exc)
             self.session.rollback()
             raise
 
+    @synchronized
+    def snapshot(self) -> int:
+        """
+        Write the objects pending in shared-memory mode to the database.
+
+        Returns
+        -------
+        int
+            The number of objects written.
+        """
+        if not isinstance(self.backend, SharedMemoryAllocator):
+            return 0
+        return self.backend.snapshot()
+
+    def enable_profiling(self, profiler=None) -> Profiler:
+        """
+        Start recording timing spans around the allocator's hot paths.
+
+        Parameters
+        ----------
+        profiler : Profiler, optional
+            The profiler to record into. Defaults to a new one.
+
+        Returns
+        -------
+        Profiler
+            The profiler, which exports Chrome trace JSON and collapsed stacks.
+        """
+        self.profiler = profiler if profiler is not None else Profiler()
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        """Stop recording timing spans."""
+        self.profiler = NULL_PROFILER
+
+    def close(self) -> None:
+        """
+        Stop background maintenance, write a final shared-memory snapshot,
+        close the session and release the connection pool.
+        """
+        self.stop_reserve_maintenance()
+        if isinstance(self.backend, SharedMemoryAllocator):
+            self.backend.close()
+        self.session.close()
+        self.engine.dispose()
+
+    def start_reserve_maintenance(self, **options) -> ReserveMaintainer:
+        """
+        Start a background thread that keeps a reserve of empty blocks.
+
+        Parameters
+        ----------
+        **options
+            Passed to ReserveMaintainer (reserve_blocks, max_reserve_blocks,
+            interval, reserve_pools, reserve_arenas).
+
+        Returns
+        -------
+        ReserveMaintainer
+            The running maintainer.
+
+        Raises
+        ------
+        ValueError
+            If the database cannot be shared with the maintenance thread.
+        """
+        if self.maintainer is not None:
+            self.maintainer.stop()
+        maintainer = ReserveMaintainer(self, **options)
+        maintainer.start()
+        self.maintainer = maintainer
+        return maintainer
+
+    def stop_reserve_maintenance(self) -> None:
+        """
+        Stop the background reserve maintenance, if it is running.
+        """
+        if self.maintainer is not None:
+            self.maintainer.stop()
+            self.maintainer = None
+
 if __name__ == "__main__":
     try:
         # Initialize the memory manager with a SQLite database URL
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from memorymanager import MemManager
+from database_models import Arena, Pool, Block
+from helpers.analytics import load_columns
+
+class TestAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.memory_manager = MemManager("sqlite://")
+        self.objects = [f"Analytics Object {i} " * (i * 15 + 5) for i in range(6)]
+        for obj in self.objects:
+            self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.free_memory_for_object(self.objects[2])
+
+    def test_load_columns(self):
+        tables = load_columns(self.memory_manager.engine)
+        session = self.memory_manager.session
+
+        self.assertEqual(len(tables["blocks"]["id"]), session.query(Block).count())
+        self.assertEqual(int(tables["blocks"]["mem"].sum()),
+                         sum(block.mem for block in session.query(Block)))
+        self.assertEqual(tables["ledger"]["object_id"].dtype.kind, "U")
+
+    def test_memory_report(self):
+        report = self.memory_manager.memory_report(bins=4)
+        session = self.memory_manager.session
+
+        self.assertEqual(report["fill_histogram"]["counts"].sum(), session.query(Block).count())
+        self.assertEqual(report["objects"]["objects"], len(self.objects) - 1)
+        expected_sizes = sorted(self.memory_manager.sizer(obj)
+                                for i, obj in enumerate(self.objects) if i != 2)
+        self.assertEqual(sorted(report["objects"]["sizes"].tolist()), expected_sizes)
+
+        pools = report["pools"]
+        for pool in session.query(Pool):
+            index = int(np.searchsorted(pools["id"], pool.id))
+            self.assertEqual(pools["mem"][index], pool.mem)
+            self.assertEqual(pools["blocks"][index], len(pool.blocks))
+        self.assertEqual(report["arenas"]["pools"].sum(), session.query(Pool).count())
+        self.assertEqual(len(report["arenas"]["id"]), session.query(Arena).count())
+
+        fragmentation = report["fragmentation"]
+        self.assertEqual(fragmentation["blocks"], fragmentation["empty_blocks"]
+                         + fragmentation["partial_blocks"] + fragmentation["full_blocks"])
+        self.assertTrue(0.0 <= fragmentation["fragmentation"] <= 1.0)
+
+    def test_memory_report_of_empty_database(self):
+        report = MemManager("sqlite://").memory_report()
+        self.assertEqual(report["objects"]["objects"], 0)
+        self.assertEqual(report["fragmentation"]["blocks"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
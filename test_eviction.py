@@ -0,0 +1,127 @@
+import time
+import unittest
+from sqlalchemy import func
+from memorymanager import MemManager
+from database_models import Block, StoredObject
+from helpers.eviction import EvictionPolicy, LFUPolicy, LRUPolicy, TTLPolicy, get_eviction_policy
+
+class TestEvictionPolicies(unittest.TestCase):
+    def test_lru_order_follows_access(self):
+        policy = LRUPolicy()
+        for object_id in "abc":
+            policy.insert(object_id)
+        policy.access("a")
+        self.assertEqual(list(policy.victims()), ["b", "c", "a"])
+
+    def test_lfu_order_follows_frequency(self):
+        policy = LFUPolicy()
+        for object_id in "abc":
+            policy.insert(object_id)
+        policy.access("a")
+        policy.access("a")
+        policy.access("c")
+        self.assertEqual(list(policy.victims()), ["b", "c", "a"])
+
+    def test_ttl_reports_expired_objects(self):
+        policy = TTLPolicy(ttl=0.05)
+        policy.insert("a")
+        time.sleep(0.06)
+        policy.insert("b")
+        self.assertEqual(policy.expired(), ["a"])
+        self.assertEqual(list(policy.victims()), ["a", "b"])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            get_eviction_policy("random")
+
+    def test_policy_is_abstract(self):
+        with self.assertRaises(TypeError):
+            EvictionPolicy()  # pylint: disable=abstract-class-instantiated
+
+class TestMemoryPressure(unittest.TestCase):
+    def setUp(self):
+        # Room for 8 blocks of 512 bytes
+        self.memory_manager = MemManager("sqlite://", max_mem=4096)
+        self.objects = [f"Object {i} " * 40 for i in range(12)]
+
+    def stored_ids(self):
+        return {object_id for (object_id,) in
+                self.memory_manager.session.query(StoredObject.object_id)}
+
+    def object_id(self, obj):
+        return self.memory_manager.generate_object_id(obj)
+
+    def test_free_capacity_is_tracked_exactly(self):
+        for obj in self.objects[:3]:
+            self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.free_memory_for_object(self.objects[1])
+
+        used = self.memory_manager.session.query(func.sum(Block.mem)).scalar()
+        self.assertEqual(self.memory_manager.used_memory(), used)
+        self.assertEqual(self.memory_manager.free_memory(), 4096 - used)
+
+    def test_full_memory_raises_without_policy(self):
+        with self.assertRaises(MemoryError):
+            for obj in self.objects:
+                self.memory_manager.allocate_memory_for_object(obj)
+        self.assertLessEqual(self.memory_manager.used_memory(), 4096)
+
+    def test_lru_evicts_in_bulk(self):
+        self.memory_manager.set_eviction_policy("lru", high_watermark=0.9, low_watermark=0.5)
+        for obj in self.objects[:3]:
+            self.memory_manager.allocate_memory_for_object(obj)
+        # Touch the oldest object so that it survives the eviction
+        self.memory_manager.get_object(self.objects[0])
+        for obj in self.objects[3:]:
+            self.memory_manager.allocate_memory_for_object(obj)
+
+        self.assertLessEqual(self.memory_manager.used_memory(), 0.9 * 4096)
+        stored = self.stored_ids()
+        self.assertIn(self.object_id(self.objects[-1]), stored)
+        self.assertNotIn(self.object_id(self.objects[1]), stored)
+        self.assertEqual(len(self.memory_manager.eviction), len(stored))
+        used = self.memory_manager.session.query(func.sum(Block.mem)).scalar()
+        self.assertEqual(self.memory_manager.used_memory(), used)
+
+    def test_eviction_reaches_low_watermark(self):
+        self.memory_manager.set_eviction_policy("lfu", high_watermark=0.9, low_watermark=0.5)
+        for obj in self.objects[:6]:
+            self.memory_manager.allocate_memory_for_object(obj)
+        used_before = self.memory_manager.used_memory()
+
+        evicted = self.memory_manager.evict(used_before - 1024)
+        self.assertGreater(len(evicted), 1)
+        self.assertLessEqual(self.memory_manager.used_memory(), 1024)
+
+    def test_rounding_placement_is_checked_with_the_charged_size(self):
+        memory_manager = MemManager("sqlite://", sizer=len, placement="buddy", max_mem=4000)
+        for letter in "abcdefg":
+            memory_manager.allocate_memory_for_object(letter * 512)
+        self.assertEqual(memory_manager.used_memory(), 3584)
+
+        # 350 bytes are charged as a 512-byte buddy chunk
+        with self.assertRaises(MemoryError):
+            memory_manager.allocate_memory_for_object("h" * 350)
+        self.assertEqual(memory_manager.used_memory(), 3584)
+        self.assertGreaterEqual(memory_manager.free_memory(), 0)
+
+    def test_pressure_callback_can_free_objects(self):
+        calls = []
+        remaining = list(self.objects)
+
+        def release_oldest(memory_manager, needed):
+            calls.append(needed)
+            freed = 0
+            while freed < needed:
+                obj = remaining.pop(0)
+                freed += memory_manager.sizer(obj)
+                memory_manager.free_memory_for_object(obj)
+
+        self.memory_manager.add_pressure_callback(release_oldest)
+        for obj in self.objects:
+            self.memory_manager.allocate_memory_for_object(obj)
+        self.assertTrue(calls)
+        self.assertIn(self.object_id(self.objects[-1]), self.stored_ids())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from memorymanager import MemManager
+from database_models import Arena, Pool, Block, Ledger
+
+class TestGenerations(unittest.TestCase):
+    def setUp(self):
+        self.memory_manager = MemManager("sqlite://")
+        self.collector = self.memory_manager.enable_generations((3, 2, 10))
+        self.session = self.memory_manager.session
+
+    def generation_of(self, obj):
+        object_id = self.memory_manager.generate_object_id(obj)
+        return {generation for (generation,) in self.session.query(Arena.generation)
+                .join(Ledger, Ledger.arena_id == Arena.id)
+                .filter(Ledger.object_id == object_id)}
+
+    def assert_indexes_consistent(self):
+        for generation, placement in self.memory_manager.placements.items():
+            expected = type(placement)()
+            expected.rebuild(self.session, generation)
+            self.assertEqual(placement.block_free, expected.block_free)
+            self.assertEqual(placement.pool_free, expected.pool_free)
+
+    def test_new_objects_are_young(self):
+        obj = "Young Object" * 100
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.assertEqual(self.generation_of(obj), {0})
+
+    def test_survivors_are_promoted(self):
+        survivor = "Survivor" * 100
+        self.memory_manager.allocate_memory_for_object(survivor)
+        size = self.memory_manager.sizer(survivor)
+
+        result = self.memory_manager.collect(0)
+        self.assertEqual(result["promoted"], 1)
+        self.assertEqual(result["promoted_bytes"], size)
+        self.assertEqual(self.generation_of(survivor), {1})
+        self.assertEqual(self.memory_manager.get_object(survivor), survivor)
+
+        # The young blocks are empty but kept for new allocations
+        young_mem = self.session.query(func.sum(Block.mem)).join(Pool).join(Arena)\
+            .filter(Arena.generation == 0).scalar()
+        self.assertEqual(young_mem, 0)
+        self.assertEqual(self.session.query(func.sum(Ledger.allocated_mem)).scalar(), size)
+        self.assert_indexes_consistent()
+
+        self.memory_manager.collect(1)
+        self.assertEqual(self.generation_of(survivor), {2})
+        self.assert_indexes_consistent()
+
+    def test_failed_promotion_keeps_the_ledger(self):
+        objects = [f"Promoted Object {i} " * 100 for i in range(3)]
+        for obj in objects:
+            self.memory_manager.allocate_memory_for_object(obj)
+        ledger = sorted(self.session.query(Ledger.object_id, Ledger.block_id,
+                                           Ledger.allocated_mem))
+
+        new_block = self.memory_manager._new_block  # pylint: disable=protected-access
+        calls = []
+
+        def failing_new_block(target_pool):
+            calls.append(target_pool)
+            if len(calls) == 3:
+                raise OperationalError("INSERT", {}, Exception("disk I/O error"))
+            return new_block(target_pool)
+
+        with mock.patch.object(self.memory_manager, "_new_block", failing_new_block):
+            with self.assertRaises(OperationalError):
+                self.memory_manager.collect(0)
+        self.assertEqual(sorted(self.session.query(Ledger.object_id, Ledger.block_id,
+                                                   Ledger.allocated_mem)), ledger)
+        self.assertEqual(self.session.query(Arena).filter(Arena.generation == 1).count(), 0)
+        self.assert_indexes_consistent()
+
+    def test_thresholds_trigger_collections(self):
+        objects = [f"Object {i} " * 50 for i in range(4)]
+        for obj in objects[:3]:
+            self.memory_manager.allocate_memory_for_object(obj)
+        self.assertEqual(self.collector.stats[0]["collections"], 0)
+
+        self.memory_manager.allocate_memory_for_object(objects[3])
+        self.assertEqual(self.collector.stats[0]["collections"], 1)
+        self.assertEqual(self.collector.counts, [0, 1, 0])
+        self.assertEqual(self.generation_of(objects[0]), {1})
+
+    def test_frees_offset_allocations(self):
+        for i in range(10):
+            obj = f"Short Lived {i} " * 50
+            self.memory_manager.allocate_memory_for_object(obj)
+            self.memory_manager.free_memory_for_object(obj)
+        self.assertEqual(self.collector.stats[0]["collections"], 0)
+
+    def test_old_collection_reclaims_empty_blocks(self):
+        objects = [f"Long Lived {i} " * 100 for i in range(3)]
+        for obj in objects:
+            self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.collect(0)
+        for obj in objects:
+            self.memory_manager.free_memory_for_object(obj)
+
+        result = self.memory_manager.collect(1)
+        self.assertGreater(result["reclaimed_blocks"], 0)
+        old_blocks = self.session.query(Block).join(Pool).join(Arena)\
+            .filter(Arena.generation == 1).count()
+        self.assertEqual(old_blocks, 0)
+        self.assertEqual(self.session.query(Arena).filter(Arena.generation == 1).count(), 0)
+        self.assert_indexes_consistent()
+
+    def test_collect_requires_generational_mode(self):
+        with self.assertRaises(ValueError):
+            MemManager("sqlite://").collect()
+
+if __name__ == '__main__':
+    unittest.main()
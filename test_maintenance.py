@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from memorymanager import MemManager
+from database_models import Arena, Pool, Block
+from helpers.maintenance import ReserveMaintainer
+
+class TestReserveMaintainer(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.memory_manager = MemManager(f"sqlite:///{self.path}")
+
+    def tearDown(self):
+        self.memory_manager.stop_reserve_maintenance()
+        self.memory_manager.session.close()
+        self.memory_manager.engine.dispose()
+        os.remove(self.path)
+
+    def test_fill_creates_blocks_pools_and_arenas(self):
+        maintainer = ReserveMaintainer(self.memory_manager, reserve_blocks=20,
+                                       max_reserve_blocks=40)
+        maintainer.run_once()
+
+        session = self.memory_manager.session
+        self.assertEqual(session.query(Block).filter(Block.mem == 0).count(), 20)
+        self.assertEqual(maintainer.reserve(), 20)
+        # 512-byte blocks fill a 4096-byte pool after 8 blocks
+        self.assertEqual(session.query(Pool).count(), 3)
+        self.assertEqual(session.query(Arena).count(), 1)
+
+    def test_allocations_use_the_reserve(self):
+        maintainer = ReserveMaintainer(self.memory_manager, reserve_blocks=16,
+                                       max_reserve_blocks=32)
+        maintainer.run_once()
+        session = self.memory_manager.session
+        blocks_before = session.query(Block).count()
+
+        self.memory_manager.allocate_memory_for_object("Reserve Object" * 200)
+        self.assertEqual(session.query(Block).count(), blocks_before)
+
+        maintainer.run_once()
+        self.assertEqual(maintainer.reserve(), 16)
+
+    def test_trim_returns_excess_reserve(self):
+        maintainer = ReserveMaintainer(self.memory_manager, reserve_blocks=20,
+                                       max_reserve_blocks=40)
+        maintainer.run_once()
+        maintainer.reserve_blocks = 4
+        maintainer.max_reserve_blocks = 8
+        maintainer.run_once()
+
+        session = self.memory_manager.session
+        self.assertEqual(session.query(Block).count(), 4)
+        self.assertEqual(session.query(Pool).count(), 1)
+        self.assertEqual(maintainer.stats["trimmed_blocks"], 16)
+        self.assertEqual(len(self.memory_manager.placement.block_free), 4)
+
+        # Allocations after trimming only see blocks that still exist
+        self.memory_manager.allocate_memory_for_object("Trimmed Object" * 500)
+        self.assertGreater(session.query(Block).count(), 4)
+
+    def test_fill_keeps_empty_pools_and_arenas(self):
+        maintainer = ReserveMaintainer(self.memory_manager, reserve_blocks=2,
+                                       reserve_pools=2, reserve_arenas=1)
+        maintainer.run_once()
+        session = self.memory_manager.session
+        self.assertEqual(session.query(Pool).filter(~Pool.blocks.any()).count(), 2)
+        self.assertEqual(session.query(Arena).filter(~Arena.pools.any()).count(), 1)
+
+        maintainer.run_once()
+        self.assertEqual(session.query(Pool).count(), 3)
+        self.assertEqual(session.query(Arena).count(), 2)
+
+    def test_garbage_collection_keeps_the_reserve(self):
+        self.memory_manager.allocate_memory_for_object("Garbage Object" * 500)
+        maintainer = self.memory_manager.start_reserve_maintenance(
+            reserve_blocks=4, max_reserve_blocks=8, interval=60, reserve_pools=1)
+        deadline = time.monotonic() + 5
+        while maintainer.stats["runs"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.memory_manager.free_memory_for_object("Garbage Object" * 500)
+
+        self.memory_manager.manual_garbage_collection()
+        session = self.memory_manager.session
+        self.assertEqual(session.query(Block).count(), 4)
+        self.assertEqual(session.query(Pool).filter(~Pool.blocks.any()).count(), 1)
+        self.assertEqual(maintainer.reserve(), 4)
+
+    def test_reserve_is_young_in_generational_mode(self):
+        self.memory_manager.enable_generations((100, 10, 10))
+        # The old pool keeps room for more blocks
+        self.memory_manager.allocate_memory_for_object("Old Object" * 100)
+        self.memory_manager.collect(1)
+
+        maintainer = self.memory_manager.start_reserve_maintenance(
+            reserve_blocks=40, max_reserve_blocks=80, interval=0.01)
+        deadline = time.monotonic() + 5
+        while maintainer.reserve() < 40 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.memory_manager.stop_reserve_maintenance()
+
+        session = self.memory_manager.session
+        reserve_generations = {generation for (generation,) in
+                               session.query(Arena.generation).join(Pool).join(Block)
+                               .filter(Block.mem == 0)}
+        self.assertEqual(reserve_generations, {0})
+        self.assertEqual(maintainer.reserve(), 40)
+        self.assertEqual(len(self.memory_manager.placement_for(2).empty_blocks), 0)
+
+    def test_in_memory_database_is_refused(self):
+        memory_manager = MemManager("sqlite://")
+        with self.assertRaises(ValueError):
+            memory_manager.start_reserve_maintenance()
+        self.assertIsNone(memory_manager.maintainer)
+
+    def test_only_transient_errors_are_retried(self):
+        maintainer = ReserveMaintainer(self.memory_manager, interval=0)
+        locked = OperationalError("INSERT", {}, Exception("database is locked"))
+        runs = [locked, None]
+
+        def run_once():
+            error = runs.pop(0)
+            if error is not None:
+                raise error
+            maintainer._stop.set()  # pylint: disable=protected-access
+
+        with mock.patch.object(maintainer, "run_once", run_once):
+            maintainer._run()  # pylint: disable=protected-access
+        self.assertIsNone(maintainer.error)
+
+        missing = ProgrammingError("SELECT", {}, Exception("no such table: pools"))
+        maintainer._stop.clear()  # pylint: disable=protected-access
+        with mock.patch.object(maintainer, "run_once", side_effect=missing):
+            with self.assertRaises(ProgrammingError):
+                maintainer._run()  # pylint: disable=protected-access
+        self.assertIs(maintainer.error, missing)
+
+    def test_background_thread(self):
+        maintainer = self.memory_manager.start_reserve_maintenance(
+            reserve_blocks=8, max_reserve_blocks=16, interval=0.01)
+        for i in range(5):
+            self.memory_manager.allocate_memory_for_object(f"Background Object {i}" * 50)
+        deadline = time.monotonic() + 5
+        while maintainer.reserve() < 8 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.memory_manager.stop_reserve_maintenance()
+        self.assertEqual(maintainer.reserve(), 8)
+
+if __name__ == '__main__':
+    unittest.main()
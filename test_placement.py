@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import func
+from memorymanager import MemManager
+from database_models import Block, Ledger
+from helpers.placement import (BestFitPolicy, BuddyPolicy, FirstFitPolicy, NextFitPolicy,
+                               PlacementPolicy, compare_policies, get_policy)
+
+def build_policy(policy, frees):
+    policy.add_arena(1, 262144)
+    policy.add_pool(1, 1, 4096)
+    for block_id, free in enumerate(frees, start=1):
+        policy.add_block(block_id, 1, 512, 512 - free)
+    return policy
+
+class TestPlacementPolicies(unittest.TestCase):
+    def test_first_fit_uses_lowest_block(self):
+        policy = build_policy(FirstFitPolicy(), [0, 100, 400])
+        self.assertEqual(policy.find_block(300), 2)
+
+    def test_next_fit_roves_past_full_blocks(self):
+        policy = build_policy(NextFitPolicy(), [100, 100, 100])
+        self.assertEqual(policy.find_block(100), 1)
+        policy.charge(1, 100, "a")
+        self.assertEqual(policy.find_block(100), 2)
+        policy.charge(2, 100, "b")
+        policy.release(1, 100, "a")
+        self.assertEqual(policy.find_block(100), 3)
+
+    def test_best_fit_uses_tightest_block(self):
+        policy = build_policy(BestFitPolicy(), [400, 120, 300])
+        self.assertEqual(policy.find_block(110), 2)
+        self.assertEqual(policy.find_block(250), 3)
+        # Nothing holds the whole request, so the largest block is used
+        self.assertEqual(policy.find_block(1000), 1)
+
+    def test_buddy_rounds_and_coalesces(self):
+        policy = build_policy(BuddyPolicy(), [512])
+        taken, charged = policy.charge(1, 100, "a")
+        self.assertEqual((taken, charged), (100, 128))
+        self.assertEqual(policy.block_free[1], 384)
+
+        policy.release(1, charged, "a")
+        self.assertEqual(policy.block_free[1], 512)
+        self.assertEqual(policy.find_block(512), 1)
+        self.assertEqual(policy.charge(1, 512, "b"), (512, 512))
+
+    def test_buddy_charged_size(self):
+        policy = build_policy(BuddyPolicy(), [512])
+        self.assertEqual(policy.charged_size(350), 512)
+        self.assertEqual(policy.charged_size(1249), 512 + 512 + 256)
+        self.assertEqual(FirstFitPolicy().charged_size(350), 350)
+
+    def test_get_policy(self):
+        self.assertIsInstance(get_policy("best-fit"), BestFitPolicy)
+        with self.assertRaises(ValueError):
+            get_policy("worst-fit")
+
+    def test_policy_is_abstract(self):
+        with self.assertRaises(TypeError):
+            PlacementPolicy()  # pylint: disable=abstract-class-instantiated
+
+class TestPlacementWithMemManager(unittest.TestCase):
+    def test_ledger_matches_blocks_for_every_policy(self):
+        for name in ("first-fit", "next-fit", "best-fit", "buddy"):
+            with self.subTest(policy=name):
+                memory_manager = MemManager("sqlite://", placement=name)
+                objects = [f"object {i} " * (i * 20 + 1) for i in range(8)]
+                for obj in objects:
+                    memory_manager.allocate_memory_for_object(obj)
+                for obj in objects[::2]:
+                    memory_manager.free_memory_for_object(obj)
+                memory_manager.allocate_memory_for_object("x" * 2000)
+
+                session = memory_manager.session
+                block_mem = session.query(func.sum(Block.mem)).scalar()
+                ledger_mem = session.query(func.sum(Ledger.allocated_mem)).scalar()
+                self.assertEqual(block_mem, ledger_mem)
+                self.assertEqual(session.query(func.count(Block.id)).filter(
+                    Block.mem > Block.max_mem).scalar(), 0)
+
+    def test_blocks_written_by_another_manager_are_not_overbooked(self):
+        handle, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        first = MemManager(f"sqlite:///{path}", sizer=len)
+        first.add_block(first.add_pool(first.add_arena()))
+        second = MemManager(f"sqlite:///{path}", sizer=len)
+        for memory_manager in (first, second):
+            self.addCleanup(memory_manager.engine.dispose)
+            self.addCleanup(memory_manager.session.close)
+
+        first.allocate_memory_for_object("A" * 300)
+        second.allocate_memory_for_object("B" * 300)
+
+        session = second.session
+        self.assertEqual(session.query(func.count(Block.id)).filter(
+            Block.mem > Block.max_mem).scalar(), 0)
+        self.assertEqual(session.query(func.sum(Block.mem)).scalar(),
+                         session.query(func.sum(Ledger.allocated_mem)).scalar())
+        self.assertEqual(second.used_memory(), 600)
+
+    def test_compare_policies(self):
+        workload = [("allocate", f"item {i}" * 30) for i in range(10)]
+        workload += [("free", f"item {i}" * 30) for i in range(0, 10, 3)]
+        results = compare_policies(workload, policies=["first-fit", "buddy"])
+
+        self.assertEqual(set(results), {"first-fit", "buddy"})
+        for stats in results.values():
+            self.assertEqual(stats["operations"], len(workload))
+            self.assertGreater(stats["blocks"], 0)
+            self.assertTrue(0.0 <= stats["fragmentation"] <= 1.0)
+
+    def test_compare_policies_needs_fresh_databases(self):
+        with self.assertRaises(ValueError):
+            compare_policies([], db_url="sqlite:///policies.sqlite")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import unittest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+from memorymanager import MemManager
+from database_models import Base, MemRam, Arena, Pool, Block, Ledger, StoredObject
+
+class ThrowawayPostgres:
+    """
+    A PostgreSQL server in a temporary directory, or the server named by the
+    MEMMANAGER_TEST_POSTGRES_URL environment variable.
+    """
+
+    def __init__(self):
+        self.url = os.environ.get("MEMMANAGER_TEST_POSTGRES_URL")
+        self.data_dir = None
+        if self.url:
+            return
+
+        initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+        if not initdb or not pg_ctl:
+            raise unittest.SkipTest("PostgreSQL binaries (initdb, pg_ctl) not found.")
+        try:
+            create_engine("postgresql://").dispose()
+        except ImportError as exc:
+            raise unittest.SkipTest("No PostgreSQL driver is installed.") from exc
+
+        self.data_dir = tempfile.mkdtemp()
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        try:
+            subprocess.run([initdb, "-D", self.data_dir, "-U", "postgres", "-A", "trust"],
+                           check=True, capture_output=True)
+            subprocess.run([pg_ctl, "-D", self.data_dir, "-w", "-l",
+                            os.path.join(self.data_dir, "server.log"), "-o",
+                            f"-p {port} -k {self.data_dir} -c listen_addresses=''", "start"],
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError as exc:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            raise unittest.SkipTest(f"Could not start PostgreSQL: {exc.stderr!r}") from exc
+        self.url = f"postgresql://postgres@/postgres?host={self.data_dir}&port={port}"
+
+    def stop(self):
+        if self.data_dir:
+            subprocess.run([shutil.which("pg_ctl"), "-D", self.data_dir, "-m", "fast", "stop"],
+                           check=False, capture_output=True)
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+class TestPostgresBackend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThrowawayPostgres()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        engine = create_engine(self.server.url)
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+        self.memory_manager = MemManager(self.server.url)
+
+    def tearDown(self):
+        self.memory_manager.close()
+
+    def assert_totals_consistent(self):
+        with Session(self.memory_manager.engine) as session:
+            ledger_mem = session.query(func.sum(Ledger.allocated_mem)).scalar() or 0
+            self.assertEqual(session.query(func.sum(Block.mem)).scalar() or 0, ledger_mem)
+            self.assertEqual(session.query(Block).filter(Block.mem > Block.max_mem).count(), 0)
+            for pool in session.query(Pool):
+                self.assertEqual(pool.mem, sum(block.mem for block in pool.blocks))
+            for arena in session.query(Arena):
+                self.assertEqual(arena.mem, sum(pool.mem for pool in arena.pools))
+            for memram in session.query(MemRam):
+                self.assertEqual(memram.mem or 0, sum(arena.mem for arena in memram.arenas))
+
+    def test_backend_is_selected(self):
+        self.assertIsNotNone(self.memory_manager.backend)
+        self.assertTrue(self.memory_manager.engine.pool.size() > 0)
+
+    def test_allocate_get_and_free(self):
+        obj = {"key": "Postgres Object" * 200}
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.assertEqual(self.memory_manager.get_object(obj), obj)
+
+        with Session(self.memory_manager.engine) as session:
+            self.assertEqual(session.query(func.sum(Ledger.allocated_mem)).scalar(),
+                             self.memory_manager.sizer(obj))
+        self.assert_totals_consistent()
+
+        self.memory_manager.free_memory_for_object(obj)
+        self.assertIsNone(self.memory_manager.get_object(obj))
+        with Session(self.memory_manager.engine) as session:
+            self.assertEqual(session.query(func.sum(Block.mem)).scalar(), 0)
+            self.assertEqual(session.query(Block).filter(Block.is_free == 0).count(), 0)
+        self.assert_totals_consistent()
+
+    def test_other_placements_are_refused(self):
+        with self.assertRaises(ValueError):
+            MemManager(self.server.url, placement="buddy")
+
+    def test_duplicate_allocation_is_noop(self):
+        obj = "Duplicate Object" * 100
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.allocate_memory_for_object(obj)
+
+        with Session(self.memory_manager.engine) as session:
+            self.assertEqual(session.query(StoredObject).count(), 1)
+            self.assertEqual(session.query(func.sum(Ledger.allocated_mem)).scalar(),
+                             self.memory_manager.sizer(obj))
+
+    def test_concurrent_writers(self):
+        errors = []
+
+        def writer(worker):
+            memory_manager = MemManager(self.server.url)
+            try:
+                objects = [f"Worker {worker} Object {i} " * (i * 7 + 3) for i in range(15)]
+                for obj in objects:
+                    memory_manager.allocate_memory_for_object(obj)
+                for obj in objects[::2]:
+                    memory_manager.free_memory_for_object(obj)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+            finally:
+                memory_manager.close()
+
+        threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with Session(self.memory_manager.engine) as session:
+            self.assertEqual(session.query(StoredObject).count(), 4 * 7)
+        self.assert_totals_consistent()
+
+if __name__ == '__main__':
+    unittest.main()
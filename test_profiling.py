@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from memorymanager import MemManager
+from helpers.profiling import NULL_PROFILER, Profiler, span
+
+class TestProfiler(unittest.TestCase):
+    def test_nested_spans_record_self_time(self):
+        profiler = Profiler()
+        with profiler.span("outer"):
+            with profiler.span("inner"):
+                with span("leaf"):
+                    pass
+        records = {record.name: record for record in profiler.records}
+        self.assertEqual(records["leaf"].stack, "outer;inner;leaf")
+        self.assertEqual(records["outer"].self_ns,
+                         records["outer"].duration_ns - records["inner"].duration_ns)
+
+    def test_span_outside_profiled_call_is_noop(self):
+        self.assertIs(span("leaf"), NULL_PROFILER.span("leaf"))
+
+class TestMemManagerProfiling(unittest.TestCase):
+    def setUp(self):
+        self.memory_manager = MemManager("sqlite://")
+        self.profiler = self.memory_manager.enable_profiling()
+        obj = "Profiled Object" * 100
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.free_memory_for_object(obj)
+
+    def test_phases_are_recorded(self):
+        totals = self.profiler.totals()
+        for name in ("allocate_memory_for_object", "hashing", "duplicate_check", "placement",
+                     "ledger_write", "commit", "free_memory_for_object",
+                     "listener.update_block_and_pool", "listener.update_arena_mem"):
+            self.assertIn(name, totals)
+        self.assertEqual(totals["allocate_memory_for_object"]["count"], 1)
+
+    def test_chrome_trace_export(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            self.profiler.write_chrome_trace(path)
+            with open(path, encoding="utf-8") as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+        finally:
+            os.remove(path)
+        self.assertEqual(len(events), len(self.profiler.records))
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+
+    def test_collapsed_stacks_export(self):
+        lines = self.profiler.collapsed_stacks()
+        stacks = dict(line.rsplit(" ", 1) for line in lines)
+        self.assertIn("free_memory_for_object;hashing", stacks)
+        self.assertEqual(sum(int(weight) for weight in stacks.values()),
+                         sum(record.self_ns for record in self.profiler.records))
+
+    def test_disable_profiling(self):
+        self.memory_manager.disable_profiling()
+        recorded = len(self.profiler.records)
+        self.memory_manager.allocate_memory_for_object("Unprofiled Object" * 10)
+        self.assertEqual(len(self.profiler.records), recorded)
+
+if __name__ == '__main__':
+    unittest.main()
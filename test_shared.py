@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+import uuid
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+from memorymanager import MemManager
+from database_models import Ledger, StoredObject
+from helpers.shared import SharedMemoryAllocator
+
+def worker(db_url, segment_name, worker_id):
+    memory_manager = MemManager(db_url, shared_memory=segment_name)
+    try:
+        objects = [f"Worker {worker_id} Object {i} " * (i * 5 + 3) for i in range(20)]
+        memory_manager.allocate_memory_for_object("Common Object" * 50)
+        for obj in objects:
+            memory_manager.allocate_memory_for_object(obj)
+        for obj in objects[::2]:
+            memory_manager.free_memory_for_object(obj)
+    finally:
+        memory_manager.close()
+
+def crashing_worker(db_url, segment_name, durable, pending):
+    memory_manager = MemManager(db_url, shared_memory=segment_name)
+    memory_manager.allocate_memory_for_object(durable)
+    memory_manager.snapshot()
+    memory_manager.allocate_memory_for_object(pending)
+    # Exit without close, losing the pending object
+    os._exit(0)  # pylint: disable=protected-access
+
+class TestSharedMemoryAllocator(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.db_url = f"sqlite:///{self.path}"
+        self.segment_name = f"mm_test_{uuid.uuid4().hex[:12]}"
+        self.memory_manager = MemManager(self.db_url, max_mem=1024 * 1024,
+                                         shared_memory=self.segment_name)
+
+    def tearDown(self):
+        self.memory_manager.close()
+        self.memory_manager.backend.unlink()
+        os.remove(self.path)
+
+    def ledger_mem(self):
+        with Session(self.memory_manager.engine) as session:
+            return session.query(func.sum(Ledger.allocated_mem)).scalar() or 0
+
+    def test_allocate_get_and_free(self):
+        obj = {"key": "Shared Object" * 100}
+        backend = self.memory_manager.backend
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.assertEqual(backend.used(), self.memory_manager.sizer(obj))
+        self.assertEqual(self.memory_manager.get_object(obj), obj)
+
+        # Nothing reaches the database before a snapshot
+        self.assertEqual(self.ledger_mem(), 0)
+        self.assertEqual(self.memory_manager.snapshot(), 1)
+        self.assertEqual(self.ledger_mem(), backend.used())
+        self.assertEqual(self.memory_manager.get_object(obj), obj)
+
+        self.memory_manager.free_memory_for_object(obj)
+        self.assertEqual(backend.used(), 0)
+        self.assertEqual(self.ledger_mem(), 0)
+        self.assertIsNone(self.memory_manager.get_object(obj))
+
+    def test_duplicate_allocation_is_noop(self):
+        obj = "Duplicate Object" * 100
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.memory_manager.allocate_memory_for_object(obj)
+        self.assertEqual(self.memory_manager.backend.used(), self.memory_manager.sizer(obj))
+
+    def test_segment_is_restored_from_snapshot(self):
+        objects = [f"Durable Object {i} " * 30 for i in range(5)]
+        for obj in objects:
+            self.memory_manager.allocate_memory_for_object(obj)
+        used = self.memory_manager.backend.used()
+        self.memory_manager.close()
+        self.memory_manager.backend.unlink()
+
+        self.memory_manager = MemManager(self.db_url, shared_memory=self.segment_name)
+        self.assertEqual(self.memory_manager.backend.used(), used)
+        self.assertEqual(self.memory_manager.get_object(objects[0]), objects[0])
+        self.memory_manager.allocate_memory_for_object(objects[1])
+        self.assertEqual(self.memory_manager.backend.used(), used)
+
+    def test_full_segment_raises(self):
+        allocator = SharedMemoryAllocator(self.memory_manager.engine,
+                                          f"{self.segment_name}_small", max_mem=4096)
+        try:
+            allocator.allocate("a" * 64, "first", 3000)
+            with self.assertRaises(MemoryError):
+                allocator.allocate("b" * 64, "second", 3000)
+            self.assertEqual(allocator.used(), 3000)
+        finally:
+            allocator.close()
+            allocator.unlink()
+
+    def test_refuses_databases_it_cannot_share(self):
+        with self.assertRaises(ValueError):
+            SharedMemoryAllocator(create_engine("postgresql+psycopg2://localhost/memory"),
+                                  f"{self.segment_name}_postgres")
+
+        handle, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        unshared = MemManager(f"sqlite:///{path}")
+        unshared.add_block(unshared.add_pool(unshared.add_arena()))
+        unshared.session.close()
+        unshared.engine.dispose()
+        with self.assertRaises(ValueError):
+            MemManager(f"sqlite:///{path}", shared_memory=f"{self.segment_name}_unshared")
+
+    def test_dead_process_is_reclaimed(self):
+        durable, pending = "Durable Object" * 50, "Lost Object" * 50
+        context = multiprocessing.get_context("spawn")
+        process = context.Process(target=crashing_worker,
+                                  args=(self.db_url, self.segment_name, durable, pending))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+
+        backend = self.memory_manager.backend
+        self.assertEqual(backend.used(), self.ledger_mem() + self.memory_manager.sizer(pending))
+        self.assertIsNone(self.memory_manager.get_object(pending))
+
+        # The object_id of the lost object no longer counts as stored
+        self.memory_manager.allocate_memory_for_object(pending)
+        self.assertEqual(self.memory_manager.get_object(pending), pending)
+        self.assertEqual(self.memory_manager.get_object(durable), durable)
+        self.assertEqual(backend.used(), self.ledger_mem() + self.memory_manager.sizer(pending))
+        self.assertEqual(backend.reclaim_dead_processes(), 0)
+
+    def test_concurrent_processes(self):
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=worker,
+                                     args=(self.db_url, self.segment_name, worker_id))
+                     for worker_id in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0] * 4)
+
+        with Session(self.memory_manager.engine) as session:
+            self.assertEqual(session.query(StoredObject).count(), 4 * 10 + 1)
+        self.assertEqual(self.memory_manager.backend.used(), self.ledger_mem())
+
+if __name__ == '__main__':
+    unittest.main()
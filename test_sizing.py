@@ -0,0 +1,98 @@
+import sys
+import unittest
+from memorymanager import MemManager
+from helpers.sizing import DeepSizer, SerializedSizer, ShallowSizer, Sizer, get_sizer
+
+class Record:
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+
+class SlottedRecord:
+    __slots__ = ("name", "payload")
+
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+
+class TestSizing(unittest.TestCase):
+    def setUp(self):
+        self.sizer = DeepSizer()
+
+    def test_deep_size_includes_contents(self):
+        payload = "x" * 100_000
+        obj = {"key": payload}
+
+        self.assertLess(ShallowSizer().sizeof(obj), sys.getsizeof(payload))
+        self.assertGreaterEqual(self.sizer.sizeof(obj), sys.getsizeof(obj) + sys.getsizeof(payload))
+
+    def test_deep_size_handles_cycles_and_shared_references(self):
+        shared = "y" * 1000
+        obj = [shared, shared]
+        obj.append(obj)
+
+        expected = sys.getsizeof(obj) + sys.getsizeof(shared)
+        self.assertEqual(self.sizer.sizeof(obj), expected)
+
+    def test_deep_size_of_custom_objects(self):
+        payload = list(range(1000))
+        plain = Record("a", payload)
+        slotted = SlottedRecord("a", payload)
+
+        self.assertGreater(self.sizer.sizeof(plain), sys.getsizeof(payload))
+        self.assertGreater(self.sizer.sizeof(slotted), sys.getsizeof(payload))
+        # Repeated shapes are served from the memo and stay consistent
+        self.assertEqual(self.sizer.sizeof(plain), self.sizer.sizeof(Record("a", payload)))
+
+    def test_register_fast_path(self):
+        self.sizer.register(Record, lambda obj, pending: 7)
+        self.assertEqual(self.sizer.sizeof(Record("a", "b" * 1000)), 7)
+
+    def test_get_sizer(self):
+        self.assertIsInstance(get_sizer("serialized"), SerializedSizer)
+        with self.assertRaises(ValueError):
+            get_sizer("unknown")
+
+    def test_keyed_sizes_are_cached(self):
+        calls = []
+        sizer = get_sizer(lambda obj: calls.append(obj) or 10)
+        self.assertIsInstance(sizer, Sizer)
+        self.assertEqual(sizer("a", "key"), 10)
+        self.assertEqual(sizer("a", "key"), 10)
+        self.assertEqual(len(calls), 1)
+        sizer.cache_size = 1
+        sizer("b", "other")
+        sizer("a", "key")
+        self.assertEqual(len(calls), 3)
+
+    def test_sizer_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Sizer()  # pylint: disable=abstract-class-instantiated
+
+    def test_bulk_counted_children_match_the_walk(self):
+        shared = "s" * 100
+        obj = [shared] * 20 + [str(i) * 10 for i in range(20)] + [[1.5] * 20, (2, 3)]
+        expected = (sys.getsizeof(obj) + sys.getsizeof(shared)
+                    + sum(sys.getsizeof(str(i) * 10) for i in range(20))
+                    + sys.getsizeof(obj[-2]) + sys.getsizeof(1.5)
+                    + sys.getsizeof(obj[-1]) + sys.getsizeof(2) + sys.getsizeof(3))
+        self.assertEqual(self.sizer.sizeof(obj), expected)
+
+    def test_duplicates_are_not_sized(self):
+        calls = []
+        memory_manager = MemManager("sqlite://", sizer=lambda obj: calls.append(obj) or 10)
+        memory_manager.sizer.cache_size = 0
+        memory_manager.allocate_memory_for_object("a")
+        memory_manager.allocate_memory_for_object("a")
+        self.assertEqual(len(calls), 1)
+
+    def test_memory_manager_bills_deep_size(self):
+        memory_manager = MemManager("sqlite://")
+        obj = {"key": "z" * 10_000}
+        memory_manager.allocate_memory_for_object(obj)
+
+        memory_manager.session.refresh(memory_manager.memram)
+        self.assertEqual(memory_manager.memram.mem, DeepSizer().sizeof(obj))
+
+if __name__ == '__main__':
+    unittest.main()
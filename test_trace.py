@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import func
+from memorymanager import MemManager
+from database_models import Ledger, StoredObject
+from helpers.trace import (OP_ALLOCATE, OP_FREE, OP_GET, TraceRecorder, load_workload,
+                           read_trace, replay_trace)
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def record_workload(self):
+        objects = [f"Trace Object {i} " * (i * 10 + 10) for i in range(5)]
+        with TraceRecorder(self.path, batch_size=2) as recorder:
+            memory_manager = MemManager("sqlite://", trace_recorder=recorder)
+            for obj in objects:
+                memory_manager.allocate_memory_for_object(obj)
+            memory_manager.get_object(objects[0])
+            memory_manager.free_memory_for_object(objects[1])
+        return memory_manager, objects
+
+    def test_recorder_writes_all_requests(self):
+        memory_manager, objects = self.record_workload()
+
+        records = list(read_trace(self.path))
+        self.assertEqual([record.op for record in records],
+                         [OP_ALLOCATE] * 5 + [OP_GET, OP_FREE])
+        self.assertEqual(records[0].object_id, memory_manager.generate_object_id(objects[0]))
+        self.assertEqual(records[0].size, memory_manager.sizer(objects[0]))
+        self.assertEqual(records[-1].object_id, memory_manager.generate_object_id(objects[1]))
+        timestamps = [record.timestamp for record in records]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_replay_reproduces_allocations(self):
+        original, _ = self.record_workload()
+        original_mem = original.session.query(func.sum(Ledger.allocated_mem)).scalar()
+
+        self.assertEqual(len(load_workload(self.path)), 7)
+        replayed = MemManager("sqlite://")
+        stats = replay_trace(self.path, replayed)
+
+        self.assertEqual(stats["operations"], 7)
+        self.assertEqual(replayed.session.query(func.count(StoredObject.id)).scalar(), 4)
+        self.assertEqual(replayed.session.query(func.sum(Ledger.allocated_mem)).scalar(),
+                         original_mem)
+
+    def test_read_rejects_other_files(self):
+        with open(self.path, "wb") as handle:
+            handle.write(b"not a trace")
+        with self.assertRaises(ValueError):
+            list(read_trace(self.path))
+
+if __name__ == '__main__':
+    unittest.main()